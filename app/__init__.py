@@ -17,6 +17,8 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     from app.models import db
+    from app.database import configure_engine
+    configure_engine(app)
     db.init_app(app)
     
     
@@ -27,10 +29,55 @@ def create_app(config_class=Config):
     # Register blueprints
     from app.routes.main import bp as main_bp
     from app.routes.requests_api import bp as requests_bp
-    from app.routes.model_api import bp as model_bp
+    from app.routes.metrics import bp as metrics_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(requests_bp)
-    app.register_blueprint(model_bp)
+    app.register_blueprint(metrics_bp)
+    
+    from app.services.spatial_index import spatial_index
+    from app.services.event_bus import change_bus
+    from app.services.response_cache import response_cache
+    from app.services.expiry_sweeper import expiry_sweeper
+    spatial_index.init_app(app)
+    change_bus.init_app(app)
+    response_cache.init_app(app)
+    expiry_sweeper.init_app(app)
+    
+    # Request/stage histograms plus every service's stats() on /metrics
+    from app.services.metrics import metrics
+    from app.database import pool_metrics
+    metrics.init_app(app)
+    metrics.register_collector('response_cache', response_cache.stats)
+    metrics.register_collector('change_bus', change_bus.stats)
+    metrics.register_collector('expiry_sweeper', expiry_sweeper.stats)
+    metrics.register_collector('db_pool', pool_metrics.stats)
+    
+    from commands import register_commands
+    register_commands(app)
+    
+    # Workers that don't serve predictions can leave the model API out entirely
+    if app.config.get('ENABLE_MODEL_API', True):
+        from app.routes.model_api import bp as model_bp
+        app.register_blueprint(model_bp)
+        
+        # Model settings only; the model itself is loaded lazily (see gunicorn.conf.py)
+        from app.services.model_service import model_registry
+        from app.services.inference_batcher import inference_batcher
+        from app.services import preprocessing
+        from app.services.prediction_cache import prediction_cache
+        from app.services.audit_log import audit_log
+        from app.services.admission import admission
+        model_registry.init_app(app)
+        inference_batcher.init_app(app)
+        preprocessing.init_app(app)
+        prediction_cache.init_app(app)
+        audit_log.init_app(app)
+        admission.init_app(app)
+        metrics.register_collector('model', model_registry.status)
+        metrics.register_collector('inference_batcher', inference_batcher.stats)
+        metrics.register_collector('prediction_cache', prediction_cache.stats)
+        metrics.register_collector('audit_log', audit_log.stats)
+        metrics.register_collector('admission', admission.stats)
     
     return app
\ No newline at end of file
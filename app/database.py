@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+class PoolMetrics:
+    """Checkout wait times, overflow high-water mark and timeouts across all instrumented pools"""
+
+    def __init__(self, samples=2000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=samples)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_overflow_seen = 0
+        self.pools = []
+
+    def record_checkout(self, seconds, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self._waits.append(seconds)
+            self.max_overflow_seen = max(self.max_overflow_seen, overflow)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def reset(self):
+        with self._lock:
+            self._waits.clear()
+            self.checkouts = 0
+            self.timeouts = 0
+            self.max_overflow_seen = 0
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3) if waits else None
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'max_overflow_seen': self.max_overflow_seen,
+            'checkout_wait_ms': {'p50': percentile(0.50), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                                 'max': percentile(1.0)},
+            'pools': [{
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'checked_in': pool.checkedin(),
+            } for pool in self.pools],
+        }
+
+pool_metrics = PoolMetrics()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+    
+    # Log as SQLAlchemy's pool, not under the "app" logger (Flask's app.logger, DEBUG in development)
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.QueuePool"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_metrics.pools.append(self)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - started, self.overflow())
+        return connection
+
+    def dispose(self):
+        super().dispose()
+        if self in pool_metrics.pools:
+            pool_metrics.pools.remove(self)
+
+def _pool_options(config):
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        # Recycle before SQL Server / Azure SQL drop idle connections, and ping after idle periods
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # Flask-SQLAlchemy already shares one connection for in-memory databases
+            return {}
+        # One connection per thread at a time; wait on locks instead of failing with "database is locked"
+        options = _pool_options(config)
+        options.update({
+            'pool_pre_ping': False,
+            'pool_recycle': -1,
+            'connect_args': {'check_same_thread': False, 'timeout': config.get('DB_SQLITE_BUSY_TIMEOUT', 30)},
+        })
+        return options
+
+    options = _pool_options(config)
+    if backend == 'mssql':
+        if driver == 'pyodbc':
+            # Send executemany (bulk import, audit log, bulk_insert_mappings) as one array-bound batch
+            options['fast_executemany'] = config.get('DB_FAST_EXECUTEMANY', True)
+    return options
+
+def configure_engine(app):
+    """
+    Fill SQLALCHEMY_ENGINE_OPTIONS with the per-dialect defaults; must run
+    before db.init_app(). Options already set in the config win.
+    """
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
@@ -1,8 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 from datetime import datetime
+from app.services.spatial_index import grid_cell
 
 db = SQLAlchemy()
 
+def _default_geo_cell(context):
+    # Works for single inserts and executemany/bulk inserts alike
+    params = context.get_current_parameters()
+    return grid_cell(params.get('lat'), params.get('lng'))
+
 class BloodRequest(db.Model):
     __tablename__ = "blood_requests"
     
@@ -10,12 +18,14 @@ class BloodRequest(db.Model):
     title = db.Column(db.String(200), nullable=False)
     blood_group = db.Column(db.String(5), nullable=False)  # e.g., A+, O-
     units_needed = db.Column(db.Integer, default=1)
+    units_pledged = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Opt-ins so far, see optin_service
     contact_name = db.Column(db.String(100))
     contact_phone = db.Column(db.String(30))
     contact_email = db.Column(db.String(120))
     address = db.Column(db.String(300))
     lat = db.Column(db.Float, nullable=True)
     lng = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.String(20), default=_default_geo_cell, index=True)  # Grid bucket, see spatial_index
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=True)
     is_open = db.Column(db.Boolean, default=True)
@@ -24,12 +34,20 @@ class BloodRequest(db.Model):
     # Relationship
     donors = db.relationship("DonorOptIn", back_populates="request", lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_blood_requests_lat_lng', 'lat', 'lng'),  # Bounding-box prefilter
+        db.Index('ix_blood_requests_created_at', 'created_at'),  # Newest-first listing
+        db.Index('ix_blood_requests_group_open', 'blood_group', 'is_open', 'expires_at'),  # Per-group matching
+        db.Index('ix_blood_requests_open_expires', 'is_open', 'expires_at'),  # Open listing + expiry sweep
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
             'blood_group': self.blood_group,
             'units_needed': self.units_needed,
+            'units_pledged': self.units_pledged or 0,
             'contact_name': self.contact_name,
             'contact_phone': self.contact_phone,
             'contact_email': self.contact_email,
@@ -40,14 +58,14 @@ class BloodRequest(db.Model):
             'expires_at': self.expires_at.isoformat() if self.expires_at else None,
             'is_open': self.is_open,
             'description': self.description,
-            'donor_count': len(self.donors)
+            'donor_count': self.donor_count or 0
         }
 
 class DonorOptIn(db.Model):
     __tablename__ = "donor_optin"
     
     id = db.Column(db.Integer, primary_key=True)
-    request_id = db.Column(db.Integer, db.ForeignKey("blood_requests.id"), nullable=False)
+    request_id = db.Column(db.Integer, db.ForeignKey("blood_requests.id"), nullable=False, index=True)
     donor_name = db.Column(db.String(100))
     donor_contact = db.Column(db.String(30))
     donor_blood_group = db.Column(db.String(5))
@@ -57,6 +75,11 @@ class DonorOptIn(db.Model):
     # Relationship
     request = db.relationship("BloodRequest", back_populates="donors")
     
+    __table_args__ = (
+        # One opt-in per donor per request: retried submissions can't create duplicates
+        db.UniqueConstraint('request_id', 'donor_contact', name='uq_donor_optin_request_contact'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -68,6 +91,16 @@ class DonorOptIn(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Donor count as a correlated subquery, selected with the request itself:
+# listing a page is one query instead of one extra query (and every
+# DonorOptIn row) per request
+BloodRequest.donor_count = column_property(
+    select(func.count(DonorOptIn.id))
+    .where(DonorOptIn.request_id == BloodRequest.id)
+    .correlate_except(DonorOptIn)
+    .scalar_subquery()
+)
+
 class FingerprintLog(db.Model):
     __tablename__ = "fingerprint_logs"
     
@@ -84,4 +117,46 @@ class FingerprintLog(db.Model):
             'predicted_group': self.predicted_group,
             'confidence': self.confidence,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class PredictionCacheEntry(db.Model):
+    __tablename__ = "prediction_cache"
+    
+    id = db.Column(db.Integer, primary_key=True)
+    image_hash = db.Column(db.String(64), nullable=False)  # sha256 of the uploaded bytes
+    model_version = db.Column(db.String(20), nullable=False)
+    predicted_group = db.Column(db.String(5))
+    confidence = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # TTL purge, see prediction_cache
+    
+    __table_args__ = (
+        db.UniqueConstraint('image_hash', 'model_version', name='uq_prediction_cache_hash_version'),
+    )
+
+class ChangeEventLog(db.Model):
+    __tablename__ = "change_events"
+    
+    # Outbox for the SSE change feed when several workers share it (CHANGE_BUS_SHARED)
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(30), nullable=False)
+    request_id = db.Column(db.Integer)
+    blood_group = db.Column(db.String(5))
+    lat = db.Column(db.Float)
+    lng = db.Column(db.Float)
+    payload = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchedulerLock(db.Model):
+    __tablename__ = "scheduler_locks"
+    
+    # Lease row per background job, so only one worker/host runs it at a time
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class CacheVersion(db.Model):
+    __tablename__ = "cache_versions"
+    
+    # Shared invalidation counter for the response cache: every worker reads it, any write bumps it
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,5 +1,8 @@
-from flask import Blueprint, render_template, request
-from app.models import BloodRequest
+import time
+from flask import Blueprint, render_template, request, jsonify, current_app
+from sqlalchemy import text
+from app.models import BloodRequest, db
+from app.database import pool_metrics
 
 bp = Blueprint("main", __name__)
 
@@ -7,6 +10,19 @@ bp = Blueprint("main", __name__)
 def home():
     return render_template("index.html")
 
+@bp.route("/health/db")
+def db_health():
+    """Database round trip and connection pool metrics"""
+    try:
+        started = time.perf_counter()
+        db.session.execute(text("SELECT 1"))
+        ping_ms = round((time.perf_counter() - started) * 1000, 2)
+        return jsonify({'status': 'healthy', 'dialect': db.engine.dialect.name, 'ping_ms': ping_ms,
+                        'pool': pool_metrics.stats()})
+    except Exception as e:
+        current_app.logger.error(f"Database health check failed: {str(e)}")
+        return jsonify({'status': 'unhealthy', 'error': 'Database unavailable', 'pool': pool_metrics.stats()}), 500
+
 # @bp.route("/requests")
 # def request_list():
 #     page = request.args.get('page', 1, type=int)
@@ -1,43 +1,121 @@
-import io, os
-from flask import Blueprint, request, jsonify, current_app
-from app.models import FingerprintLog, db
+import json, zipfile
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import numpy as np
-import matplotlib.pyplot as plt
-from keras.models import load_model
-from keras.preprocessing import image
-from keras.applications.imagenet_utils import preprocess_input
+from app.services.model_service import model_registry, LABELS
+from app.services.inference_batcher import inference_batcher
+from app.services.preprocessing import decode_fingerprint, decode_batch
+from app.services.prediction_cache import prediction_cache, image_hash
+from app.services.audit_log import audit_log
+from app.services.metrics import metrics
+from app.services.admission import admission
+from app.services.cooperative import run_blocking
 
 bp = Blueprint("model_api", __name__, url_prefix="/api/model")
 
+def scores_to_prediction(scores):
+    """Map one row of class scores to (blood group, confidence)"""
+    predicted_class = int(np.argmax(scores))
+    return LABELS[predicted_class], float(scores[predicted_class])
+
 def predict_fingerprint(file_data):
-    model_path = r"app\routes\models\model_blood_group_detection_resnet.h5"
-    if not model_path or not os.path.exists(model_path):
-        current_app.logger.error(f"Model file not found at path: {model_path}")
+    # Make sure the model kept resident by the registry is available
+    try:
+        handle = model_registry.get()
+    except Exception as e:
+        current_app.logger.error(f"Model not available: {str(e)}")
         return None, None
-    
-    # Load the pre-trained model
-    model = load_model(model_path)
 
-    # Define the class labels
-    labels = {'A+': 0, 'A-': 1, 'AB+': 2, 'AB-': 3, 'B+': 4, 'B-': 5, 'O+': 6, 'O-': 7}
-    labels = dict((v, k) for k, v in labels.items())
+    # Re-uploads of the same scan skip the forward pass
+    cache_key = image_hash(file_data)
+    cached = prediction_cache.get(cache_key, handle.version)
+    if cached:
+        return cached
 
-    # Load and preprocess the image
-    img = image.load_img(io.BytesIO(file_data), target_size=(256, 256))
-    x = image.img_to_array(img)
-    x = np.expand_dims(x, axis=0)
-    x = preprocess_input(x)
+    # Decode and preprocess straight into this thread's input buffer
+    x = decode_fingerprint(file_data)
 
-    result = model.predict(x)
-    predicted_class = np.argmax(result)
+    # Batched together with other concurrent requests by the scheduler
+    with metrics.stage('inference'):
+        scores = inference_batcher.predict(x)
     
     # Map the predicted class to the label
-    predicted_group = labels[predicted_class]
-    confidence = float(result[0][predicted_class])  # Convert to regular float
-    print(f"Predicted: {predicted_group} with confidence {confidence}")
+    predicted_group, confidence = scores_to_prediction(scores)
+    current_app.logger.debug(f"Predicted: {predicted_group} with confidence {confidence}")
+    prediction_cache.put(cache_key, handle.version, predicted_group, confidence)
     return predicted_group, confidence
 
+# Data placeholder for uploads past PREDICT_BULK_MAX_FILES, which are listed but never read
+SKIPPED = object()
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def invalid_archive(files):
+    """Filename of the first .zip upload that can't be opened as a zip archive, or None"""
+    for file in files:
+        if _extension(file.filename or '') != 'zip':
+            continue
+        try:
+            with zipfile.ZipFile(file.stream):
+                pass
+        except (zipfile.BadZipFile, OSError):
+            return file.filename
+        finally:
+            file.stream.seek(0)
+    return None
+
+def iter_uploaded_images(files, allowed_extensions, max_file_size, max_files=None):
+    """
+    Yield (filename, bytes) for every uploaded image, expanding zip archives.
+    bytes is None for entries that are not an accepted image type or can't
+    be extracted, and SKIPPED for everything after the first max_files.
+    """
+    count = 0
+    for file in files:
+        filename = file.filename or ''
+        file_ext = _extension(filename)
+        
+        if file_ext == 'zip':
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                        continue
+                    count += 1
+                    if max_files is not None and count > max_files:
+                        yield info.filename, SKIPPED
+                        continue
+                    entry_ext = _extension(info.filename)
+                    if entry_ext not in allowed_extensions or info.file_size > max_file_size:
+                        yield info.filename, None
+                        continue
+                    try:
+                        data = archive.read(info)
+                    except Exception:
+                        # Corrupt, encrypted or unsupported entry; the rest of the archive still counts
+                        data = None
+                    yield info.filename, data
+            continue
+        
+        count += 1
+        if max_files is not None and count > max_files:
+            yield filename, SKIPPED
+        elif file_ext in allowed_extensions:
+            yield filename, file.read()
+        else:
+            yield filename, None
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 @bp.route("/predict", methods=["POST"])
+@admission.limit
 def predict():
     """Predict blood group from fingerprint image"""
     try:
@@ -73,15 +151,14 @@ def predict():
         allowed_to_donate = bool(confidence >= threshold)
         
         # Log the prediction
+        # Queued for the background audit writer, off the request path
         try:
-            log_entry = FingerprintLog(
-                image_path=None,
-                predicted_group=predicted_group,
-                confidence=confidence,
-                ip_address=request.remote_addr
-            )
-            db.session.add(log_entry)
-            db.session.commit()
+            audit_log.record({
+                'image_path': None,
+                'predicted_group': predicted_group,
+                'confidence': confidence,
+                'ip_address': request.remote_addr
+            })
         except Exception as log_error:
             current_app.logger.error(f"Failed to log prediction: {str(log_error)}")
         
@@ -99,27 +176,165 @@ def predict():
         current_app.logger.error(f"Error in prediction endpoint: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@bp.route("/predict/batch", methods=["POST"])
+@admission.limit
+def predict_batch():
+    """Predict blood groups for many fingerprints (multipart files or a zip), streamed as NDJSON"""
+    files = request.files.getlist('fingerprints') + request.files.getlist('archive')
+    files = [f for f in files if f.filename]
+    if not files:
+        return jsonify({'error': 'No fingerprint files provided'}), 400
+    
+    try:
+        handle = model_registry.get()
+    except Exception as e:
+        current_app.logger.error(f"Model not available: {str(e)}")
+        return jsonify({'error': 'Model not available'}), 500
+    
+    config = current_app.config
+    allowed_extensions = config.get('ALLOWED_IMAGE_EXTENSIONS', {'png', 'jpg', 'jpeg', 'bmp', 'tiff'})
+    batch_size = config.get('PREDICT_BULK_BATCH_SIZE', 32)
+    max_files = config.get('PREDICT_BULK_MAX_FILES', 1000)
+    max_file_size = config.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024
+    threshold = config.get('PREDICT_THRESHOLD', 0.65)
+    ip_address = request.remote_addr
+    
+    # A broken archive fails the request up front, before the 200 and the stream start
+    bad_archive = invalid_archive(files)
+    if bad_archive:
+        return jsonify({'error': f'Invalid zip archive: {bad_archive}'}), 400
+    
+    def generate():
+        index = 0
+        failed = 0
+        skipped = 0
+        images = iter_uploaded_images(files, allowed_extensions, max_file_size, max_files)
+        
+        # One input buffer reused for every chunk of the upload
+        buffer = np.empty((batch_size, 256, 256, 3), dtype=np.float32)
+        
+        for chunk in _chunked(images, batch_size):
+            # Uploads past the limit come last; they are reported after this chunk's results
+            overflow = [filename for filename, data in chunk if data is SKIPPED]
+            chunk = [item for item in chunk if item[1] is not SKIPPED]
+            
+            # Cached images skip decoding and inference
+            keys = [image_hash(data) if data else None for _, data in chunk]
+            predictions = {}
+            for i, key in enumerate(keys):
+                cached = prediction_cache.get(key, handle.version) if key else None
+                if cached:
+                    predictions[i] = cached
+            pending = [i for i in range(len(chunk)) if i not in predictions]
+            
+            # Decode the rest in parallel on the shared pool, then one forward pass
+            with metrics.stage('decode_batch'):
+                inputs, ok = decode_batch([chunk[i][1] for i in pending], out=buffer[:len(pending)])
+            good = [i for i, decoded in zip(pending, ok) if decoded]
+            if len(good) < len(pending):
+                inputs = inputs[[j for j, decoded in enumerate(ok) if decoded]]
+            with metrics.stage('inference'):
+                scores = run_blocking(handle.model.predict, inputs) if good else []
+            for i, row in zip(good, scores):
+                predictions[i] = scores_to_prediction(row)
+                prediction_cache.put(keys[i], handle.version, *predictions[i])
+            
+            # Logged before the chunk's lines go out, so a client that disconnects mid-stream loses nothing
+            log_rows = [{
+                'image_path': None,
+                'predicted_group': predictions[i][0],
+                'confidence': predictions[i][1],
+                'ip_address': ip_address
+            } for i in sorted(predictions)]
+            if log_rows:
+                try:
+                    audit_log.record_many(log_rows)
+                except Exception as log_error:
+                    current_app.logger.error(f"Failed to log batch predictions: {str(log_error)}")
+            
+            for i, (filename, _) in enumerate(chunk):
+                if i not in predictions:
+                    failed += 1
+                    line = {'index': index, 'filename': filename, 'error': 'Failed to process image'}
+                else:
+                    predicted_group, confidence = predictions[i]
+                    line = {
+                        'index': index,
+                        'filename': filename,
+                        'predicted_group': predicted_group,
+                        'confidence': round(confidence, 4),
+                        'allowed_to_donate': bool(confidence >= threshold)
+                    }
+                index += 1
+                yield json.dumps(line) + "\n"
+            
+            # One line per upload past the limit, so the client knows what to resend
+            for filename in overflow:
+                skipped += 1
+                yield json.dumps({
+                    'index': index,
+                    'filename': filename,
+                    'error': f'Skipped: more than {max_files} images in one request'
+                }) + "\n"
+                index += 1
+        
+        yield json.dumps({
+            'done': True,
+            'total': index,
+            'succeeded': index - failed - skipped,
+            'failed': failed,
+            'skipped': skipped,
+            'max_files': max_files,
+            'model_version': handle.version
+        }) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @bp.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     try:
-        result = "success"
+        status = model_registry.status()
         
-        if result == "success":
+        if status['model_loaded']:
             return jsonify({
                 'status': 'healthy', 
-                'model_loaded': True,
-                'accuracy': '99.5%'
+                'accuracy': '99.5%',
+                **status
             })
         else:
             return jsonify({
                 'status': 'unhealthy', 
-                'error': result.get("error", "Unknown error"),
-                'model_loaded': False
+                **status
             }), 500
             
     except Exception as e:
         return jsonify({
             'status': 'unhealthy', 
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route("/stats", methods=["GET"])
+def model_stats():
+    """Batching scheduler, prediction cache, audit log and admission control metrics"""
+    return jsonify({
+        'model': model_registry.status(),
+        'batching': inference_batcher.stats(),
+        'cache': prediction_cache.stats(),
+        'audit_log': audit_log.stats(),
+        'admission': admission.stats()
+    })
+
+@bp.route("/reload", methods=["POST"])
+def reload_model():
+    """Hot-swap to the model file currently at MODEL_PATH"""
+    try:
+        handle = model_registry.load()
+        return jsonify({
+            'message': 'Model reloaded',
+            'model_version': handle.version,
+            'warmup_seconds': handle.warmup_seconds
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error reloading model: {str(e)}")
+        return jsonify({'error': 'Failed to reload model'}), 500
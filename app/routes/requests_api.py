@@ -1,13 +1,32 @@
-from flask import Blueprint, request, jsonify, current_app
+import json
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app.models import BloodRequest, DonorOptIn, db
-from app.services.geo_service import calculate_distance, filter_by_distance
+from app.services.request_query import list_open_requests
+from app.services.spatial_index import spatial_index
+from app.services.matching_service import normalize_group, recipient_groups
+from app.services import event_bus
+from app.services.event_bus import change_bus, EventFilter
+from app.services.response_cache import response_cache
+from app.services.expiry_sweeper import expiry_sweeper
+from app.services import bulk_io
+from app.services.metrics import metrics
+from app.services import serialization
+from app.services import optin_service
 from datetime import datetime
 import logging
 
 bp = Blueprint("requests_api", __name__, url_prefix="/api/requests")
 
+def notify(event_type, req, data=None):
+    """Publish a change event for the SSE feed; never fails the write that caused it"""
+    try:
+        change_bus.publish_request(event_type, req, data)
+    except Exception as e:
+        current_app.logger.error(f"Failed to publish {event_type} for request {req.id}: {str(e)}")
+
 # List blood requests with optional filters
 @bp.route("", methods=["GET"])
+@response_cache.cached
 def list_requests():
     """List blood requests with optional filters"""
     try:
@@ -15,60 +34,50 @@ def list_requests():
         blood_group = request.args.get('blood_group', '')
         lat = request.args.get('lat', type=float)
         lng = request.args.get('lng', type=float)
+        lat, lng = response_cache.bucket_location(lat, lng)
         radius_km = request.args.get('radius_km', 15, type=float)
+        radius_km = max(0.0, min(radius_km, current_app.config.get('REQUESTS_MAX_RADIUS_KM', 100)))
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
-        # Base query - only open requests that haven't expired
-        query = BloodRequest.query.filter_by(is_open=True)
+        compatible_with = request.args.get('compatible_with', '')
+        cursor = request.args.get('cursor')
+        strategy = request.args.get('spatial_index', current_app.config.get('REQUESTS_SPATIAL_INDEX', 'bbox'))
         
-        # Filter out expired requests
-        current_time = datetime.utcnow()
-        query = query.filter(
-            (BloodRequest.expires_at.is_(None)) | 
-            (BloodRequest.expires_at > current_time)
-        )
+        # Sparse fieldsets: ?fields=id,blood_group,distance_km selects only those columns
+        try:
+            fields = serialization.parse_fields(request.args.get('fields'), serialization.LIST_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Filter by blood group if specified
-        if blood_group:
-            query = query.filter_by(blood_group=blood_group)
+        # Filtering, distance ordering and pagination all run in the database
+        try:
+            with metrics.stage('db_query'):
+                rows, total, next_cursor = list_open_requests(
+                    blood_group=blood_group,
+                    lat=lat,
+                    lng=lng,
+                    radius_km=radius_km,
+                    page=page,
+                    per_page=per_page,
+                    cursor=cursor,
+                    strategy=strategy,
+                    compatible_with=compatible_with,
+                    columns=serialization.request_columns(fields)
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get all requests
-        all_requests = query.all()
-        
-        # Convert to dict and add distance if location provided
-        requests_data = []
-        for req in all_requests:
-            req_dict = req.to_dict()
-            
-            # Calculate distance if user location provided
-            if lat and lng and req.lat and req.lng:
-                distance = calculate_distance(lat, lng, req.lat, req.lng)
-                req_dict['distance_km'] = round(distance, 2)
-                
-                # Skip if outside radius
-                if distance > radius_km:
-                    continue
+        with metrics.stage('serialization'):
+            paginated_requests = [serialization.request_row(row, fields, distance) for row, distance in rows]
             
-            requests_data.append(req_dict)
-        
-        # Sort by distance if location provided, otherwise by creation date (newest first)
-        if lat and lng:
-            requests_data.sort(key=lambda x: x.get('distance_km', float('inf')))
-        else:
-            requests_data.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-        # Paginate manually
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_requests = requests_data[start:end]
-        
-        return jsonify({
-            'requests': paginated_requests,
-            'total': len(requests_data),
-            'page': page,
-            'per_page': per_page
-        })
+            return serialization.json_response({
+                'requests': paginated_requests,
+                'total': total,
+                'page': page,
+                'per_page': per_page,
+                'next_cursor': next_cursor
+            })
         
     except Exception as e:
         current_app.logger.error(f"Error listing requests: {str(e)}")
@@ -79,21 +88,12 @@ def list_requests():
 def cleanup_expired_requests():
     """Mark expired requests as closed (can be called by a cron job)"""
     try:
-        current_time = datetime.utcnow()
-        expired_requests = BloodRequest.query.filter(
-            BloodRequest.is_open == True,
-            BloodRequest.expires_at.isnot(None),
-            BloodRequest.expires_at <= current_time
-        ).all()
-        
-        for request in expired_requests:
-            request.is_open = False
-        
-        db.session.commit()
+        # Set-based, chunked UPDATEs; also invalidates caches and publishes events
+        closed_ids = expiry_sweeper.sweep()
         
         return jsonify({
-            'message': f'Marked {len(expired_requests)} requests as expired',
-            'expired_count': len(expired_requests)
+            'message': f'Marked {len(closed_ids)} requests as expired',
+            'expired_count': len(closed_ids)
         })
         
     except Exception as e:
@@ -131,6 +131,9 @@ def create_request():
         
         db.session.add(new_request)
         db.session.commit()
+        spatial_index.add_request(new_request)
+        response_cache.bump()
+        notify(event_bus.REQUEST_CREATED, new_request, new_request.to_dict())
         
         return jsonify({
             'message': 'Request created successfully',
@@ -144,6 +147,7 @@ def create_request():
         return jsonify({'error': 'Failed to create request'}), 500
 
 @bp.route("/<int:req_id>", methods=["GET"])
+@response_cache.cached
 def get_request(req_id):
     # \"\"\"Get a specific blood request\"\"\"
     try:
@@ -155,15 +159,9 @@ def get_request(req_id):
 
 @bp.route("/<int:req_id>/optin", methods=["POST"])
 def donor_optin(req_id):
-    # \"\"\"Allow a donor to opt-in for a specific request\"\"\"
+    """Allow a donor to opt-in for a specific request (idempotent per donor contact)"""
     try:
-        data = request.get_json()
-        
-        # Validate request exists
-        blood_request = BloodRequest.query.get_or_404(req_id)
-        
-        if not blood_request.is_open:
-            return jsonify({'error': 'This request is no longer open'}), 400
+        data = request.get_json() or {}
         
         # Validate required fields
         required_fields = ['donor_name', 'donor_contact', 'donor_blood_group']
@@ -171,21 +169,43 @@ def donor_optin(req_id):
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Create donor opt-in record
-        donor_optin = DonorOptIn(
-            request_id=req_id,
-            donor_name=data['donor_name'],
-            donor_contact=data['donor_contact'],
-            donor_blood_group=data['donor_blood_group'],
-            prediction_confidence=data.get('confidence', 0.0)
-        )
+        # Pledge a unit and create the opt-in in one transaction
+        result = optin_service.register_optin(req_id, {
+            'donor_name': data['donor_name'],
+            'donor_contact': str(data['donor_contact']).strip(),
+            'donor_blood_group': data['donor_blood_group'],
+            'prediction_confidence': data.get('confidence', 0.0)
+        })
         
-        db.session.add(donor_optin)
-        db.session.commit()
+        if result.status == 'not_found':
+            return jsonify({'error': 'Request not found'}), 404
+        if result.status == 'closed':
+            return jsonify({'error': 'This request is no longer open'}), 400
+        
+        req = result.request
+        counters = {
+            'units_needed': req.units_needed,
+            'units_pledged': req.units_pledged,
+            'is_open': req.is_open
+        }
+        if result.status == 'duplicate':
+            return jsonify({
+                'message': 'Already registered as donor',
+                'donor_id': result.donor_id,
+                **counters
+            }), 200
+        
+        response_cache.bump()
+        notify(event_bus.REQUEST_OPTIN, req, {'id': req_id, **counters})
+        if result.closed_now:
+            # Fulfilled: drop it from everything that lists open requests
+            spatial_index.remove(req_id)
+            notify(event_bus.REQUEST_CLOSED, req, {'id': req_id, 'reason': 'fulfilled', **counters})
         
         return jsonify({
             'message': 'Successfully registered as donor',
-            'donor_id': donor_optin.id
+            'donor_id': result.donor_id,
+            **counters
         }), 201
         
     except Exception as e:
@@ -194,19 +214,145 @@ def donor_optin(req_id):
         return jsonify({'error': 'Failed to register as donor'}), 500
     
 @bp.route("/<int:req_id>/donors", methods=["GET"])
+@response_cache.cached
 def get_request_donors(req_id):
     """Get all donors who opted in for a specific request"""
     try:
         # Validate request exists
         blood_request = BloodRequest.query.get_or_404(req_id)
         
-        # Get all donors for this request
-        donors = DonorOptIn.query.filter_by(request_id=req_id).order_by(DonorOptIn.created_at.desc()).all()
+        # Get all donors for this request, only the requested columns
+        try:
+            fields = serialization.parse_fields(request.args.get('fields'), serialization.DONOR_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        donors = DonorOptIn.query.with_entities(*serialization.donor_columns(fields)).filter_by(
+            request_id=req_id
+        ).order_by(DonorOptIn.created_at.desc()).all()
         
-        return jsonify({
-            'donors': [donor.to_dict() for donor in donors]
+        return serialization.json_response({
+            'donors': [serialization.donor_row(donor, fields) for donor in donors]
         })
         
     except Exception as e:
         current_app.logger.error(f"Error getting donors for request {req_id}: {str(e)}")
-        return jsonify({'error': 'Failed to retrieve donors'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to retrieve donors'}), 500
+
+# Bulk import of requests or donor opt-ins from CSV / NDJSON
+@bp.route("/bulk", methods=["POST"])
+def bulk_import():
+    """Stream-parse an uploaded CSV/NDJSON file and bulk insert the valid rows"""
+    try:
+        kind = request.args.get('kind', 'requests')
+        upload = request.files.get('file')
+        # Either a multipart upload or the raw request body
+        stream = upload.stream if upload else request.stream
+        fmt = bulk_io.detect_format(
+            request.args.get('format'),
+            filename=upload.filename if upload else None,
+            mimetype=upload.mimetype if upload else request.mimetype
+        )
+        
+        summary = bulk_io.import_records(
+            bulk_io.iter_records(stream, fmt),
+            kind=kind,
+            chunk_size=current_app.config.get('BULK_IMPORT_CHUNK_SIZE', 1000),
+            max_errors=current_app.config.get('BULK_IMPORT_MAX_ERRORS', 100)
+        )
+        if summary['inserted']:
+            # The spatial index picks up the new ids on its next sync
+            response_cache.bump()
+        
+        return jsonify(summary), 201 if summary['inserted'] else 400
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error in bulk import: {str(e)}")
+        return jsonify({'error': 'Failed to import records'}), 500
+
+# Streaming export
+@bp.route("/export", methods=["GET"])
+def export_records():
+    """Stream requests or donor opt-ins as CSV/NDJSON/JSON in constant memory"""
+    try:
+        kind = request.args.get('kind', 'requests')
+        fmt = bulk_io.detect_format(request.args.get('format', 'ndjson'), formats=bulk_io.EXPORT_FORMATS)
+        if kind not in bulk_io.KINDS:
+            raise ValueError(f"Unknown kind: {kind}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    chunks = bulk_io.iter_export(
+        kind=kind,
+        fmt=fmt,
+        open_only=request.args.get('open_only', '0') == '1',
+        chunk_size=current_app.config.get('BULK_EXPORT_CHUNK_SIZE', 1000)
+    )
+    mimetype = {'csv': 'text/csv', 'json': 'application/json'}.get(fmt, 'application/x-ndjson')
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
+@bp.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    """Response cache, change feed and expiry sweeper counters"""
+    return jsonify({
+        'response_cache': response_cache.stats(),
+        'change_bus': change_bus.stats(),
+        'expiry_sweeper': expiry_sweeper.stats()
+    })
+
+@bp.route("/stream", methods=["GET"])
+def stream_changes():
+    """Server-sent events for request changes (replaces polling the list)"""
+    try:
+        blood_groups = [normalize_group(g) for g in request.args.getlist('blood_group') if g]
+        compatible_with = request.args.get('compatible_with', '')
+        if compatible_with:
+            blood_groups = blood_groups or recipient_groups(compatible_with)
+        event_filter = EventFilter(
+            blood_groups=blood_groups or None,
+            lat=request.args.get('lat', type=float),
+            lng=request.args.get('lng', type=float),
+            radius_km=request.args.get('radius_km', type=float)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # EventSource sends Last-Event-ID on reconnect; allow it as a query param too
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    
+    subscription = change_bus.subscribe(event_filter, last_event_id)
+    if subscription is None:
+        # Every stream pins a worker thread; past the cap the page polls instead
+        response = jsonify({'error': 'Too many live update streams, poll /api/requests instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                events = subscription.wait(heartbeat)
+                if subscription.dropped:
+                    # Fell too far behind: client should reload the list
+                    subscription.dropped = False
+                    yield "event: reset\ndata: {}\n\n"
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    data = json.dumps(dict(event.data, request_id=event.request_id), default=str)
+                    yield f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+        finally:
+            change_bus.unsubscribe(subscription)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
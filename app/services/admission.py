@@ -0,0 +1,253 @@
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process limit
+    fcntl = None
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, rate, burst, now) -> float:
+        """Spend one token; 0 on success, else seconds until one is available"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+class LocalSlots:
+    """size slots shared by the threads of this process"""
+
+    def __init__(self, size):
+        self.size = size
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self._used >= self.size:
+                return None
+            self._used += 1
+            return True
+
+    def release(self, token):
+        with self._lock:
+            self._used -= 1
+
+class FileSlots:
+    """
+    size slots shared by every worker process on the host, one lock file per
+    slot. flock() locks are dropped by the kernel when a worker dies, so a
+    killed worker (e.g. gunicorn's timeout) never leaks a slot.
+    """
+
+    def __init__(self, directory, name, size):
+        self.size = size
+        os.makedirs(directory, exist_ok=True)
+        self._paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(size)]
+
+    def try_acquire(self):
+        # Random start spreads contention over the files
+        start = random.randrange(self.size) if self.size else 0
+        for i in range(self.size):
+            fd = os.open(self._paths[(start + i) % self.size], os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def release(self, fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+class AdmissionController:
+    """
+    Admission control for the model endpoints, so a burst of uploads can't
+    occupy every worker and starve GET /api/requests and the health checks.
+
+    A request first spends a token from its client's bucket (keyed on
+    remote_addr; 429 when empty). It then takes one of max_concurrent
+    inference slots. When none is free it may wait in a bounded queue for up
+    to queue_timeout. When the queue is full, or the wait runs out, the
+    response is 503. Both carry Retry-After. Slots are counted per worker and
+    default to the batch size, since the InferenceBatcher only batches the
+    requests admitted in its own worker; ADMISSION_SHARED makes them lock
+    files shared by every worker on the host. The token buckets live in each
+    worker.
+    """
+
+    POLL_SECONDS = 0.01
+
+    def __init__(self):
+        self.enabled = True
+        self.max_concurrent = 16
+        self.queue_size = 8
+        self.queue_timeout = 5.0
+        self.rate = 2.0
+        self.burst = 10
+        self.max_clients = 10000
+        self.retry_after = 5
+        self._slots = None
+        self._queue = None
+        self._buckets = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.in_flight = 0
+        self.waiting = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('ADMISSION_ENABLED', True)
+        # Fewer slots than the batch size would cap every micro-batch at the slot count
+        batch_size = config.get('PREDICT_BATCH_MAX_SIZE', 16) if config.get('PREDICT_BATCHING_ENABLED', True) else 1
+        self.max_concurrent = config.get('ADMISSION_MAX_CONCURRENT') or batch_size
+        if self.max_concurrent < batch_size:
+            app.logger.warning(f"ADMISSION_MAX_CONCURRENT={self.max_concurrent} limits prediction batches "
+                               f"below PREDICT_BATCH_MAX_SIZE={batch_size}")
+        self.queue_size = config.get('ADMISSION_QUEUE_SIZE', self.queue_size)
+        self.queue_timeout = config.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', self.queue_timeout)
+        self.rate = config.get('ADMISSION_RATE_PER_SECOND', self.rate)
+        self.burst = config.get('ADMISSION_BURST', self.burst)
+        self.max_clients = config.get('ADMISSION_MAX_CLIENTS', self.max_clients)
+        self.retry_after = config.get('ADMISSION_RETRY_AFTER_SECONDS', self.retry_after)
+
+        lock_dir = config.get('ADMISSION_LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'bloodclan-admission')
+        if fcntl is not None and config.get('ADMISSION_SHARED', False):
+            self._slots = FileSlots(lock_dir, 'inference', self.max_concurrent)
+            self._queue = FileSlots(lock_dir, 'queue', self.queue_size)
+        else:
+            self._slots = LocalSlots(self.max_concurrent)
+            self._queue = LocalSlots(self.queue_size)
+        app.extensions['admission'] = self
+
+    def _retry_after_rate(self, client):
+        """0 if client may proceed, else whole seconds until its next token"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self._buckets_lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.burst, now)
+                # Forget the least recently seen clients
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            wait = bucket.take(self.rate, self.burst, now)
+        return math.ceil(wait) if wait else 0
+
+    def _count(self, name, delta=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def acquire(self):
+        """A held inference slot, or None when the request is shed"""
+        token = self._slots.try_acquire()
+        if token is not None:
+            return token
+
+        ticket = self._queue.try_acquire()
+        if ticket is None:
+            self._count('shed_queue_full')
+            return None
+        self._count('queued')
+        self._count('waiting')
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.POLL_SECONDS)
+                token = self._slots.try_acquire()
+                if token is not None:
+                    return token
+        finally:
+            self._count('waiting', -1)
+            self._queue.release(ticket)
+        self._count('shed_timeout')
+        return None
+
+    def release(self, token):
+        self._slots.release(token)
+        self._count('in_flight', -1)
+
+    def limit(self, view):
+        """Decorator: admit the request or answer 429 / 503 with Retry-After"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+
+            retry_after = self._retry_after_rate(request.remote_addr or 'unknown')
+            if retry_after:
+                self._count('rate_limited')
+                response = jsonify({'error': 'Too many prediction requests, slow down'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
+            token = self.acquire()
+            if token is None:
+                response = jsonify({'error': 'Prediction service is busy, try again shortly'})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(self.retry_after)
+                return response
+            self._count('admitted')
+            self._count('in_flight')
+
+            released = False
+            try:
+                response = view(*args, **kwargs)
+                if getattr(response, 'is_streamed', False):
+                    # Streamed NDJSON keeps running inference after the view returns
+                    response.call_on_close(lambda: self.release(token))
+                    released = True
+                return response
+            finally:
+                if not released:
+                    self.release(token)
+        return wrapper
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'shared': isinstance(self._slots, FileSlots),
+                'max_concurrent': self.max_concurrent,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rate_limited': self.rate_limited,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+                'clients_tracked': len(self._buckets),
+            }
+
+admission = AdmissionController()
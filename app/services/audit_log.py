@@ -0,0 +1,307 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.models import FingerprintLog, db
+
+def _json_default(value):
+    # Spill rows hold datetimes and NumPy scalars (model confidences)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value.item() if hasattr(value, 'item') else str(value)
+
+class AuditLogWriter:
+    """
+    Writes FingerprintLog rows off the request thread.
+
+    record() puts a row on a bounded queue and returns immediately; a
+    background thread bulk-inserts batches of up to batch_size rows, or
+    whatever has arrived after flush_seconds. When the queue is full (the
+    database is slow or down) rows are appended to a local NDJSON spill file
+    instead of blocking predictions, and failed batches are spilled too.
+    Spill files are replayed into the table once inserts succeed again; a
+    file is deleted only after all its rows are in, and what a failed replay
+    leaves behind is retried on the next one.
+    """
+
+    # Another worker's spill file is claimed once it has been quiet this long
+    SPILL_SETTLE_SECONDS = 5
+    # ... and another worker's claimed file once it looks abandoned
+    STALE_REPLAY_SECONDS = 600
+
+    def __init__(self, queue_size=10000, batch_size=200, flush_seconds=1.0, spill_dir='audit_spill'):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.spill_dir = spill_dir
+        self.put_timeout = 0.0
+        self.enabled = True
+        self._app = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._atexit_registered = False
+        self.replay_seconds = 30.0
+        self._next_replay = 0.0
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AUDIT_LOG_ASYNC', True)
+        self.queue_size = app.config.get('AUDIT_LOG_QUEUE_SIZE', self.queue_size)
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', self.batch_size)
+        self.flush_seconds = app.config.get('AUDIT_LOG_FLUSH_SECONDS', self.flush_seconds)
+        self.spill_dir = app.config.get('AUDIT_LOG_SPILL_DIR', self.spill_dir)
+        self.put_timeout = app.config.get('AUDIT_LOG_PUT_TIMEOUT_MS', 0) / 1000.0
+        self.replay_seconds = app.config.get('AUDIT_LOG_REPLAY_SECONDS', self.replay_seconds)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._app = app
+        app.extensions['audit_log'] = self
+
+    def _ensure_worker(self):
+        # Start lazily, and again after a fork: threads don't survive fork()
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._worker = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+
+    def record(self, row: dict):
+        """Queue one FingerprintLog row (column name -> value)"""
+        row.setdefault('created_at', datetime.utcnow())
+        if not self.enabled:
+            self._insert([row])
+            return
+        self._ensure_worker()
+        try:
+            # Back-pressure: wait at most put_timeout for room, then spill
+            if self.put_timeout:
+                self._queue.put(row, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(row)
+            self.enqueued += 1
+        except queue.Full:
+            self._spill([row])
+
+    def record_many(self, rows):
+        """Queue several rows; one multi-row INSERT when the writer is disabled"""
+        if not self.enabled:
+            if rows:
+                for row in rows:
+                    row.setdefault('created_at', datetime.utcnow())
+                self._insert(rows)
+            return
+        for row in rows:
+            self.record(row)
+
+    def flush(self, timeout=10.0) -> bool:
+        """Write everything queued so far; True once it is in the database or a spill file"""
+        if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+            rows = self._drain()
+            if rows:
+                self._write(rows)
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if isinstance(item, threading.Event):
+                item.set()
+            else:
+                rows.append(item)
+
+    def _collect(self):
+        # Wait up to flush_seconds for the first row, then fill the batch until the window closes
+        rows, markers = [], []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                # flush(): write what we have now
+                markers.append(item)
+                break
+            rows.append(item)
+        return rows, markers
+
+    def _run(self):
+        while True:
+            rows, markers = self._collect()
+            if rows:
+                self._write(rows)
+            elif time.monotonic() >= self._next_replay:
+                # Idle: retry spilled rows now and then
+                self._next_replay = time.monotonic() + self.replay_seconds
+                self._replay_spill()
+            for marker in markers:
+                marker.set()
+
+    def _insert(self, rows):
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(insert(FingerprintLog.__table__), rows)
+
+    def _write(self, rows):
+        try:
+            self._insert(rows)
+            self.written += len(rows)
+            self.batches += 1
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self._app.logger.error(f"Audit log insert failed, spilling {len(rows)} rows: {str(e)}")
+            self._spill(rows)
+
+    def _spill_path(self):
+        return os.path.join(self.spill_dir, f"fingerprint_logs.{os.getpid()}.ndjson")
+
+    def _spill(self, rows):
+        try:
+            with self._spill_lock:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(self._spill_path(), 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=_json_default) + '\n')
+            self.spilled += len(rows)
+        except OSError as e:
+            self.dropped += len(rows)
+            if self._app is not None:
+                self._app.logger.error(f"Audit log spill failed, dropped {len(rows)} rows: {str(e)}")
+
+    def _claim(self, path, min_age):
+        """
+        Rename path to <spill file>.replay.<pid>; the new path, or None if it
+        is too recently modified or another worker claimed it first.
+        """
+        pid = os.getpid()
+        own = path.endswith(f".{pid}.ndjson") or path.endswith(f".replay.{pid}")
+        try:
+            if not own and time.time() - os.path.getmtime(path) < min_age:
+                return None
+            claimed = path.split('.replay.')[0] + f".replay.{pid}"
+            if claimed != path:
+                # rename is atomic: only one worker replays a given file
+                with self._spill_lock:
+                    os.rename(path, claimed)
+            return claimed
+        except OSError:
+            return None
+
+    def _replay_spill(self):
+        """Load spill files (from any worker) back into the table once the database is reachable"""
+        pattern = os.path.join(self.spill_dir, 'fingerprint_logs.*.ndjson')
+        # Other workers may still be appending to their own spill file
+        for path in glob.glob(pattern):
+            self._claim(path, self.SPILL_SETTLE_SECONDS)
+        # Claimed files, including ones a failed replay or an exited worker left behind
+        for path in glob.glob(f"{pattern}.replay.*"):
+            claimed = self._claim(path, self.STALE_REPLAY_SECONDS)
+            if claimed and not self._replay_file(claimed):
+                return
+
+    def _replay_file(self, path):
+        """Insert one claimed spill file and delete it; False if the database failed"""
+        rows, unreadable = [], 0
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                        if row.get('created_at'):
+                            row['created_at'] = datetime.fromisoformat(row['created_at'])
+                    except ValueError:
+                        # Partly written when a worker died or the disk filled up
+                        unreadable += 1
+                        continue
+                    rows.append(row)
+        except OSError as e:
+            self._app.logger.error(f"Unreadable audit spill file {path}: {str(e)}")
+            return True
+        if unreadable:
+            self.dropped += unreadable
+            self._app.logger.error(f"Skipped {unreadable} unreadable lines in audit spill file {path}")
+
+        for start in range(0, len(rows), self.batch_size):
+            try:
+                self._insert(rows[start:start + self.batch_size])
+                self.replayed += len(rows[start:start + self.batch_size])
+            except Exception as e:
+                # Keep only what is left in the claimed file, for the next attempt
+                self.last_error = str(e)
+                self._app.logger.error(f"Audit log replay failed: {str(e)}")
+                self._rewrite(path, rows[start:])
+                return False
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return True
+
+    def _rewrite(self, path, rows):
+        tmp = os.path.join(self.spill_dir, f"rewrite.{os.getpid()}.tmp")
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=_json_default) + '\n')
+            os.replace(tmp, path)
+        except OSError as e:
+            # The file still holds every row; the batches already inserted will be replayed again
+            self._app.logger.error(f"Failed to rewrite audit spill file {path}: {str(e)}")
+
+    def stats(self):
+        return {
+            'async': self.enabled,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+audit_log = AuditLogWriter()
@@ -0,0 +1,293 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+
+from app.models import BloodRequest, DonorOptIn, db
+from app.services.matching_service import normalize_group
+from app.services.optin_service import pledge_update
+from app.services.serialization import dumps, iter_json_array
+
+FORMATS = ('csv', 'ndjson')
+# Export also offers one JSON array, streamed item by item
+EXPORT_FORMATS = FORMATS + ('json',)
+
+# Columns written on export and read on import, per record kind. id and
+# units_pledged are exported but ignored on import: requests get new ids and
+# units_pledged is rebuilt as the opt-ins are imported. Because of the new ids,
+# an exported donors file can't be imported again; validate_donor rejects rows
+# that still carry their id
+REQUEST_COLUMNS = ['id', 'title', 'blood_group', 'units_needed', 'units_pledged', 'contact_name', 'contact_phone',
+                   'contact_email', 'address', 'lat', 'lng', 'created_at', 'expires_at', 'is_open', 'description']
+DONOR_COLUMNS = ['id', 'request_id', 'donor_name', 'donor_contact', 'donor_blood_group', 'prediction_confidence',
+                 'created_at']
+KINDS = {
+    'requests': (BloodRequest, REQUEST_COLUMNS),
+    'donors': (DonorOptIn, DONOR_COLUMNS),
+}
+
+def detect_format(fmt=None, filename=None, mimetype=None, formats=FORMATS) -> str:
+    """Explicit format, else file extension, else content type; defaults to NDJSON"""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in formats:
+            raise ValueError(f"Unknown format: {fmt} (use one of {', '.join(formats)})")
+        return fmt
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename and filename.lower().endswith('.json') and 'json' in formats:
+        return 'json'
+    if mimetype and 'csv' in mimetype:
+        return 'csv'
+    return 'ndjson'
+
+def iter_records(stream, fmt):
+    """
+    Stream-parse a binary file object into (line_no, record, error) without
+    reading it into memory. Exactly one of record / error is set.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Empty cells mean "not given", same as a missing JSON key
+            yield reader.line_num, {k: v for k, v in record.items() if k and v not in ('', None)}, None
+        return
+
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, record, None
+
+def _required(record, fields):
+    for field in fields:
+        if record.get(field) in (None, ''):
+            raise ValueError(f"{field} is required")
+
+def _float(value, name, low, high):
+    if value in (None, ''):
+        return None
+    value = float(value)
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def _bool(value, default=True):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+def _check_lengths(model, row):
+    """Reject strings longer than their column, which would fail the whole chunk's INSERT"""
+    columns = model.__table__.c
+    for name, value in row.items():
+        length = getattr(columns[name].type, 'length', None)
+        if length and isinstance(value, str) and len(value) > length:
+            raise ValueError(f"{name} is longer than {length} characters")
+    return row
+
+def validate_request(record) -> dict:
+    """Insert mapping for a BloodRequest row; raises ValueError with a readable message"""
+    _required(record, ['title', 'blood_group', 'contact_name', 'contact_phone'])
+    lat = _float(record.get('lat'), 'lat', -90, 90)
+    lng = _float(record.get('lng'), 'lng', -180, 180)
+    if (lat is None) != (lng is None):
+        raise ValueError("lat and lng must be given together")
+    return _check_lengths(BloodRequest, {
+        'title': str(record['title'])[:200],
+        'blood_group': normalize_group(record['blood_group']),
+        'units_needed': int(record.get('units_needed') or 1),
+        # Counted again by the donors import (_pledge_imported), so a re-imported export isn't pledged twice
+        'units_pledged': 0,
+        'contact_name': str(record['contact_name']),
+        'contact_phone': str(record['contact_phone']),
+        'contact_email': record.get('contact_email', ''),
+        'address': record.get('address', ''),
+        'lat': lat,
+        'lng': lng,
+        'description': record.get('description', ''),
+        'created_at': _datetime(record.get('created_at')) or datetime.utcnow(),
+        'expires_at': _datetime(record.get('expires_at')),
+        'is_open': _bool(record.get('is_open')),
+    })
+
+def validate_donor(record) -> dict:
+    """Insert mapping for a DonorOptIn row (request existence is checked per chunk)"""
+    _required(record, ['request_id', 'donor_name', 'donor_contact', 'donor_blood_group'])
+    if record.get('id') not in (None, ''):
+        raise ValueError("Exported opt-ins can't be re-imported: their request_id refers to the exporting "
+                         "database (remove the id column if the request ids are valid here)")
+    return _check_lengths(DonorOptIn, {
+        'request_id': int(record['request_id']),
+        'donor_name': str(record['donor_name']),
+        'donor_contact': str(record['donor_contact']).strip(),
+        'donor_blood_group': normalize_group(record['donor_blood_group']),
+        'prediction_confidence': _float(record.get('prediction_confidence'), 'prediction_confidence', 0, 1) or 0.0,
+        'created_at': _datetime(record.get('created_at')) or datetime.utcnow(),
+    })
+
+VALIDATORS = {'requests': validate_request, 'donors': validate_donor}
+
+def _insert_chunk(kind, chunk, errors):
+    """executemany one chunk; returns the number of rows inserted"""
+    if kind == 'donors':
+        request_ids = {row['request_id'] for _, row in chunk}
+        known = set(db.session.execute(
+            select(BloodRequest.id).where(BloodRequest.id.in_(request_ids))
+        ).scalars())
+        for line_no, row in chunk:
+            if row['request_id'] not in known:
+                errors.append((line_no, f"Unknown request_id: {row['request_id']}"))
+        chunk = [(line_no, row) for line_no, row in chunk if row['request_id'] in known]
+        
+        # One opt-in per (request, donor contact), as uq_donor_optin_request_contact enforces
+        seen = set(db.session.execute(
+            select(DonorOptIn.request_id, DonorOptIn.donor_contact).where(DonorOptIn.request_id.in_(request_ids))
+        ).tuples())
+        unique = []
+        for line_no, row in chunk:
+            key = (row['request_id'], row['donor_contact'])
+            if key in seen:
+                errors.append((line_no, f"Duplicate opt-in for request {row['request_id']}: {row['donor_contact']}"))
+                continue
+            seen.add(key)
+            unique.append((line_no, row))
+        chunk = unique
+        if not chunk:
+            return 0
+
+    try:
+        _insert_rows(kind, chunk)
+        db.session.commit()
+        return len(chunk)
+    except DBAPIError:
+        db.session.rollback()
+
+    # Redo the chunk one row at a time, so only the rows the database refuses fail
+    inserted = 0
+    for line_no, row in chunk:
+        try:
+            _insert_rows(kind, [(line_no, row)])
+            db.session.commit()
+            inserted += 1
+        except DBAPIError as e:
+            db.session.rollback()
+            errors.append((line_no, f"Rejected by the database: {str(e.orig)}"))
+    return inserted
+
+def _insert_rows(kind, chunk):
+    model, _ = KINDS[kind]
+    db.session.execute(insert(model), [row for _, row in chunk])
+    if kind == 'donors':
+        _pledge_imported(chunk)
+
+def _pledge_imported(chunk):
+    # Keep units_pledged in step with the imported opt-ins: one UPDATE per distinct pledge count
+    units = defaultdict(int)
+    for _, row in chunk:
+        units[row['request_id']] += 1
+    by_units = defaultdict(list)
+    for request_id, count in units.items():
+        by_units[count].append(request_id)
+    for count, request_ids in by_units.items():
+        db.session.execute(pledge_update(count).where(BloodRequest.id.in_(request_ids)))
+
+def import_records(records, kind='requests', chunk_size=1000, max_errors=100) -> dict:
+    """
+    Validate and bulk insert parsed records chunk by chunk (one executemany
+    + commit per chunk). Rows that fail validation are skipped and reported
+    with their line number; the first max_errors are kept in the summary.
+    """
+    if kind not in VALIDATORS:
+        raise ValueError(f"Unknown kind: {kind} (use one of {', '.join(VALIDATORS)})")
+    validate = VALIDATORS[kind]
+
+    errors = []
+    failed = 0
+    inserted = 0
+    chunk = []
+    for line_no, record, error in records:
+        if error is None:
+            try:
+                chunk.append((line_no, validate(record)))
+            except (ValueError, TypeError) as e:
+                error = str(e)
+        if error is not None:
+            errors.append((line_no, error))
+        if len(chunk) >= chunk_size:
+            inserted += _insert_chunk(kind, chunk, errors)
+            chunk = []
+        if len(errors) > max_errors:
+            # Keep memory bounded on a file that is wrong throughout
+            failed += len(errors) - max_errors
+            del errors[max_errors:]
+    if chunk:
+        inserted += _insert_chunk(kind, chunk, errors)
+
+    failed += len(errors)
+    return {
+        'kind': kind,
+        'inserted': inserted,
+        'failed': failed,
+        'errors': [{'line': line_no, 'error': error} for line_no, error in sorted(errors)[:max_errors]],
+    }
+
+def export_rows(kind='requests', open_only=False, chunk_size=1000):
+    """
+    Yield chunks of row tuples for an export, read with a server-side cursor
+    (stream_results) so memory stays flat however large the table is.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind} (use one of {', '.join(KINDS)})")
+    model, columns = KINDS[kind]
+    stmt = select(*[getattr(model, name) for name in columns]).order_by(model.id)
+    if open_only and kind == 'requests':
+        stmt = stmt.where(BloodRequest.is_open == True)
+
+    connection = db.session.connection().execution_options(stream_results=True, yield_per=chunk_size)
+    result = connection.execute(stmt)
+    try:
+        for partition in result.partitions(chunk_size):
+            yield partition
+    finally:
+        result.close()
+
+def iter_export(kind='requests', fmt='ndjson', open_only=False, chunk_size=1000):
+    """Serialized export as bytes, one piece per chunk of rows (CSV starts with a header)"""
+    _, columns = KINDS[kind]
+    if fmt == 'json':
+        records = (dict(zip(columns, row)) for rows in export_rows(kind, open_only, chunk_size) for row in rows)
+        yield from iter_json_array(records, chunk_size)
+        return
+    if fmt == 'ndjson':
+        for rows in export_rows(kind, open_only, chunk_size):
+            yield b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in export_rows(kind, open_only, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
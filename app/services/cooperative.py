@@ -0,0 +1,31 @@
+"""
+Keeps CPU-heavy work off the gevent hub. Under gunicorn's gevent worker (the
+default, see gunicorn.conf.py) the threading module is monkey-patched, so the
+app's background "threads" are greenlets, and a model forward pass or image
+decode run on one would stall every connection of the worker, SSE streams
+included. These helpers hand that work to native threads instead; without
+gevent they are plain calls and a plain ThreadPoolExecutor.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from gevent import monkey
+except ImportError:  # gthread/sync workers don't need gevent
+    monkey = None
+
+def gevent_patched() -> bool:
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def run_blocking(fn, *args):
+    """fn(*args) on the hub's native thread pool under gevent, inline otherwise"""
+    if gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+def native_thread_pool(max_workers, thread_name_prefix=''):
+    """ThreadPoolExecutor whose workers are OS threads even when threading is patched"""
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
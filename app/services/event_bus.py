@@ -0,0 +1,284 @@
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+# Event types published by the requests API
+REQUEST_CREATED = 'request.created'
+REQUEST_OPTIN = 'request.optin'
+REQUEST_CLOSED = 'request.closed'
+REQUEST_EXPIRED = 'request.expired'
+
+ChangeEvent = namedtuple("ChangeEvent", ["id", "type", "request_id", "blood_group", "lat", "lng", "data"])
+
+class EventFilter:
+    """Per-subscriber filter on blood group and region (centre + radius)"""
+
+    def __init__(self, blood_groups=None, lat=None, lng=None, radius_km=None):
+        self.blood_groups = set(blood_groups) if blood_groups else None
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+
+    def matches(self, event: ChangeEvent) -> bool:
+        if self.blood_groups is not None and event.blood_group not in self.blood_groups:
+            return False
+        if self.lat is not None and self.lng is not None and self.radius_km is not None:
+            # Requests without a location are never filtered out by region
+            if event.lat is not None and event.lng is not None:
+                from app.services.geo_service import haversine
+                if haversine(self.lat, self.lng, event.lat, event.lng) > self.radius_km:
+                    return False
+        return True
+
+class Subscription:
+    def __init__(self, event_filter: EventFilter, max_pending: int):
+        self.filter = event_filter
+        self._pending = deque(maxlen=max_pending)
+        self._ready = threading.Event()
+        # Ids already delivered: a Last-Event-ID replay and the relay can overlap
+        self._seen = deque(maxlen=max_pending)
+        self._seen_ids = set()
+        self._seen_lock = threading.Lock()
+        self.dropped = False
+
+    def deliver(self, event: ChangeEvent):
+        if not self.filter.matches(event):
+            return
+        with self._seen_lock:
+            if event.id in self._seen_ids:
+                return
+            if len(self._seen) == self._seen.maxlen:
+                self._seen_ids.discard(self._seen[0])
+            self._seen.append(event.id)
+            self._seen_ids.add(event.id)
+        if len(self._pending) == self._pending.maxlen:
+            # Slow client: tell it to reload instead of buffering forever
+            self.dropped = True
+        self._pending.append(event)
+        self._ready.set()
+
+    def wait(self, timeout: float):
+        """Pending events, or [] after timeout (caller sends a keep-alive)"""
+        self._ready.wait(timeout)
+        self._ready.clear()
+        events = []
+        while self._pending:
+            events.append(self._pending.popleft())
+        return events
+
+class ChangeBus:
+    """
+    Fans request change events out to SSE subscribers.
+
+    Single process: events are delivered as soon as they are published and a
+    ring buffer serves Last-Event-ID resumes. With CHANGE_BUS_SHARED on (the
+    default under gunicorn with more than one worker, see gunicorn.conf.py),
+    each publish is written to the change_events table and a relay thread in
+    every worker polls it, so a tab connected to one gunicorn worker also sees
+    writes made by the others. Event ids are then the change_events primary
+    key, the same on every worker, so Last-Event-ID resumes anywhere.
+
+    Autoincrement ids are assigned at insert but become visible at commit, so
+    a lower id can appear after a higher one was relayed. Ids skipped by the
+    relay are re-checked for gap_seconds before they are given up on.
+
+    Every PURGE_EVERY-th insert trims the table to the last history_size
+    events and to retention_minutes. While a worker has no subscribers its
+    relay stops polling, and the first new subscriber restarts it from the
+    newest event.
+    """
+
+    PURGE_EVERY = 100
+    # Rows this young are kept even past history_size, so a lagging relay still finds them
+    PURGE_MIN_AGE_SECONDS = 60
+
+    def __init__(self, history_size=1000, shared=False, poll_seconds=1.0, max_pending=500, max_subscribers=0,
+                 gap_seconds=10.0, retention_minutes=60):
+        self.history_size = history_size
+        self.retention_minutes = retention_minutes
+        self.shared = shared
+        self.poll_seconds = poll_seconds
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self.gap_seconds = gap_seconds
+        self._gaps = {}
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._app = None
+        self._relay = None
+        self._relay_pid = None
+        self._last_relayed = None
+        self.published = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        self.history_size = app.config.get('CHANGE_BUS_HISTORY', self.history_size)
+        self.retention_minutes = app.config.get('CHANGE_BUS_RETENTION_MINUTES', self.retention_minutes)
+        self.shared = app.config.get('CHANGE_BUS_SHARED', self.shared)
+        self.poll_seconds = app.config.get('CHANGE_BUS_POLL_SECONDS', self.poll_seconds)
+        self.max_subscribers = app.config.get('SSE_MAX_SUBSCRIBERS', self.max_subscribers)
+        self._history = deque(self._history, maxlen=self.history_size)
+        self._app = app
+        app.extensions['change_bus'] = self
+
+    def publish(self, event_type, request_id, blood_group=None, lat=None, lng=None, data=None):
+        data = data or {}
+        if self.shared:
+            from app.models import ChangeEventLog, db
+            # Own transaction, so it never commits the caller's session
+            with db.engine.begin() as conn:
+                result = conn.execute(ChangeEventLog.__table__.insert().values(
+                    event_type=event_type,
+                    request_id=request_id,
+                    blood_group=blood_group,
+                    lat=lat,
+                    lng=lng,
+                    payload=json.dumps(data, default=str),
+                    created_at=datetime.utcnow()
+                ))
+            self.published += 1
+            event_id = result.inserted_primary_key[0]
+            # Ids are shared, so across all workers one insert in PURGE_EVERY trims the outbox
+            if event_id % self.PURGE_EVERY == 0:
+                try:
+                    self.purge(event_id)
+                except Exception as e:
+                    self._app.logger.error(f"Failed to purge change events: {str(e)}")
+            return event_id
+
+        with self._lock:
+            event = ChangeEvent(self._next_id, event_type, request_id, blood_group, lat, lng, data)
+            self._next_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        self.published += 1
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return event.id
+
+    def purge(self, newest_id, now=None):
+        """Delete outbox rows past history_size events or older than retention_minutes"""
+        from app.models import ChangeEventLog, db
+        now = now or datetime.utcnow()
+        log = ChangeEventLog.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(log.delete().where(or_(
+                log.c.created_at < now - timedelta(minutes=self.retention_minutes),
+                and_(log.c.id <= newest_id - self.history_size,
+                     log.c.created_at < now - timedelta(seconds=self.PURGE_MIN_AGE_SECONDS))
+            ))).rowcount
+
+    def publish_request(self, event_type, req, data=None):
+        """Publish an event about a BloodRequest row"""
+        return self.publish(event_type, req.id, req.blood_group, req.lat, req.lng, data)
+
+    def subscribe(self, event_filter: EventFilter, last_event_id=None):
+        """A new Subscription, or None when this worker already holds max_subscribers streams"""
+        subscription = Subscription(event_filter, self.max_pending)
+        if self.shared:
+            self._ensure_relay()
+            if not self._subscribers:
+                # The relay was idle: start from now, not from whatever piled up meanwhile
+                self._reset_relay_position()
+        with self._lock:
+            if self.max_subscribers and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self._subscribers.add(subscription)
+            if last_event_id is not None and not self.shared:
+                for event in self._history:
+                    if event.id > last_event_id:
+                        subscription.deliver(event)
+        if last_event_id is not None and self.shared:
+            for event in self._fetch_after(last_event_id, limit=self.history_size):
+                subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _fetch(self, condition, limit=500):
+        from app.models import ChangeEventLog
+        with self._app.app_context():
+            rows = (ChangeEventLog.query.filter(condition(ChangeEventLog))
+                    .order_by(ChangeEventLog.id).limit(limit).all())
+            return [ChangeEvent(row.id, row.event_type, row.request_id, row.blood_group, row.lat, row.lng,
+                                json.loads(row.payload or '{}')) for row in rows]
+
+    def _fetch_after(self, last_id, limit=500):
+        return self._fetch(lambda log: log.id > last_id, limit)
+
+    def _poll_relay(self):
+        """Events committed since the last poll, including late commits that filled a gap"""
+        events = []
+        if self._gaps:
+            now = time.monotonic()
+            # Give up on ids that never committed (rolled back, or deleted)
+            self._gaps = {gap: seen for gap, seen in self._gaps.items() if now - seen < self.gap_seconds}
+            gaps = list(self._gaps)
+            if gaps:
+                events = self._fetch(lambda log: log.id.in_(gaps))
+                for event in events:
+                    self._gaps.pop(event.id, None)
+        now = time.monotonic()
+        for event in self._fetch_after(self._last_relayed):
+            # Large jumps are identity cache skips (SQL Server restarts), not pending commits
+            if event.id - self._last_relayed <= self.max_pending:
+                for missing in range(self._last_relayed + 1, event.id):
+                    self._gaps.setdefault(missing, now)
+            self._last_relayed = event.id
+            events.append(event)
+        return events
+
+    def _reset_relay_position(self):
+        from app.models import ChangeEventLog, db
+        with self._app.app_context():
+            newest = db.session.query(db.func.max(ChangeEventLog.id)).scalar() or 0
+        with self._lock:
+            self._last_relayed = newest
+            self._gaps = {}
+
+    def _ensure_relay(self):
+        # One relay thread per worker process, started on first subscriber
+        if self._relay is not None and self._relay_pid == os.getpid() and self._relay.is_alive():
+            return
+        with self._lock:
+            if self._relay is not None and self._relay_pid == os.getpid() and self._relay.is_alive():
+                return
+            self._relay = threading.Thread(target=self._run_relay, name="change-bus-relay", daemon=True)
+            self._relay_pid = os.getpid()
+            self._relay.start()
+
+    def _run_relay(self):
+        while True:
+            try:
+                if self._subscribers:
+                    for event in self._poll_relay():
+                        for subscription in list(self._subscribers):
+                            subscription.deliver(event)
+            except Exception as e:
+                self._app.logger.error(f"Change bus relay failed: {str(e)}")
+            time.sleep(self.poll_seconds)
+
+    def stats(self):
+        return {
+            'shared': self.shared,
+            'subscribers': len(self._subscribers),
+            'max_subscribers': self.max_subscribers,
+            'rejected': self.rejected,
+            'published': self.published,
+            'history': len(self._history),
+        }
+
+change_bus = ChangeBus()
@@ -0,0 +1,198 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import BloodRequest, SchedulerLock, db
+from app.services import event_bus
+from app.services.event_bus import change_bus
+from app.services.prediction_cache import prediction_cache
+from app.services.response_cache import response_cache
+from app.services.spatial_index import spatial_index
+
+LOCK_NAME = 'expiry_sweeper'
+
+class ExpirySweeper:
+    """
+    Closes expired blood requests with set-based UPDATEs in bounded chunks.
+
+    Each chunk selects up to chunk_size ids off the (is_open, expires_at)
+    index and closes them with one UPDATE ... WHERE id IN (...), so a large
+    backlog never holds a long transaction or loads rows into the session.
+    After each chunk the response cache is bumped, the ids leave the spatial
+    index and a request.expired event is published.
+
+    Runs from `flask sweep-expired`, POST /api/requests/cleanup-expired, or a
+    background thread in every worker (EXPIRY_SWEEPER_ENABLED) where a lease
+    row in scheduler_locks elects the single worker that actually sweeps.
+    The same tick also purges expired rows from the shared prediction cache.
+    """
+
+    def __init__(self, chunk_size=500, interval_seconds=60):
+        self.chunk_size = chunk_size
+        self.interval_seconds = interval_seconds
+        self.enabled = False
+        self.owner = None
+        self._app = None
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.closed_total = 0
+        self.last_closed = 0
+        self.last_run_at = None
+        self.last_duration_ms = None
+        self.is_leader = False
+
+    def init_app(self, app):
+        self.chunk_size = app.config.get('EXPIRY_SWEEP_CHUNK_SIZE', self.chunk_size)
+        self.interval_seconds = app.config.get('EXPIRY_SWEEP_INTERVAL_SECONDS', self.interval_seconds)
+        self.enabled = app.config.get('EXPIRY_SWEEPER_ENABLED', self.enabled)
+        self._app = app
+        app.extensions['expiry_sweeper'] = self
+
+    def sweep(self, now=None, max_chunks=None):
+        """Close every open request expired at `now`; returns the closed ids"""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        closed = []
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            rows = db.session.execute(
+                select(BloodRequest.id, BloodRequest.blood_group, BloodRequest.lat, BloodRequest.lng)
+                .where(
+                    BloodRequest.is_open == True,
+                    BloodRequest.expires_at.isnot(None),
+                    BloodRequest.expires_at <= now
+                )
+                .order_by(BloodRequest.expires_at)
+                .limit(self.chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            rows = self._close(rows)
+            chunks += 1
+            closed.extend(row.id for row in rows)
+            if rows:
+                self._after_chunk(rows)
+
+        self.runs += 1
+        self.last_closed = len(closed)
+        self.closed_total += len(closed)
+        self.last_run_at = now
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        return closed
+
+    def _close(self, rows):
+        """
+        Close the chunk and return the rows this sweep actually closed. If
+        an opt-in or another sweeper closed some of them after the SELECT,
+        the rowcount comes up short. The batch is then redone one row at a
+        time, so a request is never announced or counted twice.
+        """
+        def close(ids):
+            return db.session.execute(
+                update(BloodRequest)
+                .where(BloodRequest.id.in_(ids), BloodRequest.is_open == True)
+                .values(is_open=False)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        if close([row.id for row in rows]) == len(rows):
+            db.session.commit()
+            return rows
+        db.session.rollback()
+        closed = [row for row in rows if close([row.id]) == 1]
+        db.session.commit()
+        return closed
+
+    def _after_chunk(self, rows):
+        # Everything that caches open requests has to forget these rows
+        response_cache.bump()
+        for row in rows:
+            spatial_index.remove(row.id)
+            try:
+                change_bus.publish(event_bus.REQUEST_EXPIRED, row.id, row.blood_group, row.lat, row.lng,
+                                   {'id': row.id})
+            except Exception as e:
+                self._app.logger.error(f"Failed to publish expiry of request {row.id}: {str(e)}")
+
+    def purge_caches(self, now=None):
+        """Delete expired rows from the shared prediction cache table; returns the number deleted"""
+        try:
+            return prediction_cache.purge_expired(now)
+        except Exception as e:
+            self._app.logger.error(f"Prediction cache purge failed: {str(e)}")
+            return 0
+
+    def acquire_lease(self, lease_seconds=None):
+        """Take or renew the scheduler_locks lease; True if this process is the leader"""
+        lease_seconds = lease_seconds or self.interval_seconds * 3
+        self.owner = self.owner or f"{socket.gethostname()}:{os.getpid()}"
+        now = datetime.utcnow()
+        until = now + timedelta(seconds=lease_seconds)
+        with db.engine.begin() as conn:
+            renewed = conn.execute(
+                update(SchedulerLock)
+                .where(
+                    SchedulerLock.name == LOCK_NAME,
+                    or_(SchedulerLock.owner == self.owner, SchedulerLock.expires_at < now)
+                )
+                .values(owner=self.owner, expires_at=until)
+            ).rowcount
+        if not renewed:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(SchedulerLock).values(name=LOCK_NAME, owner=self.owner, expires_at=until))
+                renewed = 1
+            except IntegrityError:
+                renewed = 0
+        self.is_leader = bool(renewed)
+        return self.is_leader
+
+    def start(self, app=None):
+        """Start the background thread in this process (no-op unless EXPIRY_SWEEPER_ENABLED)"""
+        app = app or self._app
+        if not self.enabled or app is None:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return True
+            # The owner id includes the pid, so a forked worker gets its own
+            self.owner = None
+            self._thread = threading.Thread(target=self._run, args=(app,), name="expiry-sweeper", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+        return True
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    if self.acquire_lease():
+                        self.sweep()
+                        self.purge_caches()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Expiry sweep failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(self.interval_seconds)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'leader': self.is_leader,
+            'runs': self.runs,
+            'closed_total': self.closed_total,
+            'last_closed': self.last_closed,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_duration_ms': self.last_duration_ms,
+        }
+
+expiry_sweeper = ExpirySweeper()
@@ -1,51 +1,126 @@
 import math
 from typing import List, Tuple
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+import numpy as np
+
+# Radius of earth in kilometers
+EARTH_RADIUS_KM = 6371
+
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
     # \"\"\"
-    # Calculate the great circle distance between two points 
-    # on the earth (specified in decimal degrees)
-    # Returns distance in kilometers
+    # Vectorised haversine: any argument may be a scalar or an array, and
+    # they broadcast against each other. Returns distances in kilometers.
+    # Missing coordinates (NaN) give NaN distances.
     # \"\"\"
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+
     # Haversine formula
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    # Radius of earth in kilometers
-    r = 6371
-    return c * r
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # \"\"\"
+    # Calculate the great circle distance between two points
+    # on the earth (specified in decimal degrees)
+    # Returns distance in kilometers
+    # \"\"\"
+    return float(haversine_np(lat1, lon1, lat2, lon2))
+
+# Same sphere as haversine(): one degree of latitude is R * pi / 180 km
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180
+# Absorbs float rounding on the box edges
+_BOX_EPSILON_DEG = 1e-9
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple:
+    # \"\"\"
+    # (min_lat, max_lat, min_lng, max_lng) enclosing every point within
+    # radius_km (haversine) of a point. The lng half-width is the widest
+    # longitude extent of the spherical circle, which is wider than at the
+    # centre latitude. The lng bounds are None when the circle reaches a
+    # pole or the box crosses the antimeridian.
+    # \"\"\"
+    dlat = radius_km / KM_PER_DEGREE_LAT + _BOX_EPSILON_DEG
+    min_lat, max_lat = lat - dlat, lat + dlat
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or max_lat >= 90 or min_lat <= -90:
+        return min_lat, max_lat, None, None
+    sin_ratio = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi / 2)) / cos_lat
+    if sin_ratio >= 1:
+        return min_lat, max_lat, None, None
+    dlng = math.degrees(math.asin(sin_ratio)) + _BOX_EPSILON_DEG
+    if lng - dlng < -180 or lng + dlng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, lng - dlng, lng + dlng
+
+def approx_error_margin(lat: float, radius_km: float) -> float:
+    # \"\"\"
+    # Upper bound on the relative error of the equirectangular distance (with
+    # the cosine taken at lat) against haversine, for points up to radius_km
+    # away. Measured worst case is about a sixth of this up to 75 degrees of
+    # latitude and 300 km.
+    # \"\"\"
+    tan_lat = abs(math.tan(math.radians(min(abs(lat), 89.0))))
+    return min(1.0, radius_km / EARTH_RADIUS_KM * (1 + tan_lat) + 1e-9)
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     # \"\"\"Wrapper for haversine distance calculation\"\"\"
     return haversine(lat1, lon1, lat2, lon2)
 
+def coordinate_arrays(requests: List) -> Tuple[np.ndarray, np.ndarray]:
+    # \"\"\"
+    # Column-oriented snapshot of request coordinates: (lats, lngs) float64
+    # arrays with NaN where a request has no location
+    # \"\"\"
+    count = len(requests)
+    lats = np.fromiter((np.nan if r.lat is None else r.lat for r in requests), dtype=np.float64, count=count)
+    lngs = np.fromiter((np.nan if r.lng is None else r.lng for r in requests), dtype=np.float64, count=count)
+    return lats, lngs
+
+def distances_from(user_lat: float, user_lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    # \"\"\"Distances (km) from the user to every coordinate, one NumPy pass\"\"\"
+    return haversine_np(user_lat, user_lng, lats, lngs)
+
+def within_radius(distances: np.ndarray, max_km: float) -> np.ndarray:
+    # \"\"\"Boolean mask of distances inside the radius (NaN / missing is never inside)\"\"\"
+    with np.errstate(invalid='ignore'):
+        return distances <= max_km
+
+def top_k(distances: np.ndarray, k: int, mask: np.ndarray = None) -> np.ndarray:
+    # \"\"\"
+    # Indices of the k smallest distances (optionally only where mask is set),
+    # nearest first. argpartition keeps this O(n) plus O(k log k) for the sort.
+    # \"\"\"
+    candidates = np.flatnonzero(mask) if mask is not None else np.flatnonzero(~np.isnan(distances))
+    if k <= 0 or candidates.size == 0:
+        return candidates[:0]
+    if k < candidates.size:
+        candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+    return candidates[np.argsort(distances[candidates], kind='stable')]
+
 def filter_by_distance(user_lat: float, user_lng: float, requests: List, max_km: float = 15) -> List:
     # \"\"\"
     # Filter requests by distance from user location
     # Returns list of requests within max_km radius, sorted by distance
     # \"\"\"
-    requests_with_distance = []
-    
-    for req in requests:
-        if req.lat is not None and req.lng is not None:
-            distance = calculate_distance(user_lat, user_lng, req.lat, req.lng)
-            if distance <= max_km:
-                # Add distance to request object (temporary attribute)
-                req.distance_km = distance
-                requests_with_distance.append(req)
-    
-    # Sort by distance
-    requests_with_distance.sort(key=lambda x: x.distance_km)
-    return requests_with_distance
+    return get_nearest_requests(user_lat, user_lng, requests, max_km, limit=None)
 
 def get_nearest_requests(user_lat: float, user_lng: float, requests: List, max_km: float = 15, limit: int = 10) -> List:
     # \"\"\"
     # Get nearest requests within radius, limited to specified count
     # \"\"\"
-    filtered_requests = filter_by_distance(user_lat, user_lng, requests, max_km)
-    return filtered_requests[:limit]
\ No newline at end of file
+    requests = list(requests)
+    if not requests:
+        return []
+    lats, lngs = coordinate_arrays(requests)
+    distances = distances_from(user_lat, user_lng, lats, lngs)
+    mask = within_radius(distances, max_km)
+    order = top_k(distances, int(mask.sum()) if limit is None else limit, mask)
+
+    nearest = []
+    for i in order:
+        # Add distance to request object (temporary attribute)
+        requests[i].distance_km = float(distances[i])
+        nearest.append(requests[i])
+    return nearest
@@ -0,0 +1,104 @@
+import threading
+
+import numpy as np
+
+class KerasBackend:
+    """The full float32 Keras model (needs tensorflow + keras)"""
+
+    name = 'keras'
+
+    def __init__(self, path, threads=0):
+        # TensorFlow's thread budget is process-wide, see model_service.configure_threads
+        from keras.models import load_model
+        self.model = load_model(path)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+def _tflite_interpreter(path, threads):
+    # tflite-runtime is a few MB and leaves TensorFlow out of the worker entirely
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    return Interpreter(model_path=path, num_threads=threads or None)
+
+class TFLiteBackend:
+    """
+    A converted .tflite model (float16 or int8 post-training quantized).
+    The interpreter is not thread-safe and has a fixed input shape, so calls
+    are serialized and the batch dimension is resized when it changes.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, path, threads=0):
+        self.interpreter = _tflite_interpreter(path, threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        self.interpreter.resize_tensor_input(self._input['index'], [batch_size] + list(self._input['shape'][1:]))
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._resize(batch.shape[0])
+            self.interpreter.set_tensor(self._input['index'], _quantize(batch, self._input))
+            self.interpreter.invoke()
+            return _dequantize(self.interpreter.get_tensor(self._output['index']), self._output)
+
+def _quantize(batch, details):
+    # Only models converted with integer input/output tensors need this;
+    # convert-model keeps float32 I/O so the preprocessing stays the same
+    if details['dtype'] == np.float32:
+        return batch.astype(np.float32, copy=False)
+    scale, zero_point = details['quantization']
+    info = np.iinfo(details['dtype'])
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+def _dequantize(values, details):
+    if details['dtype'] == np.float32:
+        return values
+    scale, zero_point = details['quantization']
+    return (values.astype(np.float32) - zero_point) * scale
+
+class OnnxBackend:
+    """A converted .onnx model run by onnxruntime on the CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, path, threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+# File extension of each backend's model artifact
+EXTENSIONS = {'keras': '.h5', 'tflite': '.tflite', 'onnx': '.onnx'}
+
+def load_backend(name: str, path: str, threads: int = 0):
+    """Instantiate the inference backend called name for the model file at path"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return backend_class(path, threads)
@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from app.services.cooperative import run_blocking
+from app.services.model_service import model_registry
+
+class InferenceBatcher:
+    """
+    Collects single-image predictions from concurrent requests and runs them
+    through the model as one batch. A batch is flushed when it reaches
+    max_batch_size or when the oldest item has waited max_wait_ms.
+    """
+
+    def __init__(self, registry, max_batch_size=16, max_wait_ms=10):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.enabled = True
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._batches = 0
+        self._errors = 0
+        self._inference_seconds = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PREDICT_BATCHING_ENABLED', True)
+        self.max_batch_size = max(1, app.config.get('PREDICT_BATCH_MAX_SIZE', self.max_batch_size))
+        self.max_wait = app.config.get('PREDICT_BATCH_WAIT_MS', self.max_wait * 1000) / 1000.0
+        app.extensions['inference_batcher'] = self
+
+    def _ensure_worker(self):
+        # Start lazily, and again after a fork: threads don't survive fork()
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def submit(self, x: np.ndarray) -> Future:
+        """Queue one preprocessed image (H, W, C) and return a Future of its class scores"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((x, future))
+        return future
+
+    def predict(self, x: np.ndarray, timeout=None) -> np.ndarray:
+        """Blocking helper: class scores for one preprocessed image"""
+        if not self.enabled:
+            handle = self.registry.get()
+            return run_blocking(handle.model.predict, x[np.newaxis, ...])[0]
+        return self.submit(x).result(timeout=timeout)
+
+    def _collect(self):
+        # Block for the first item, then gather more until the window closes
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Skip requests whose caller already gave up
+            items = [(x, f) for x, f in items if f.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                handle = self.registry.get()
+                batch = np.stack([x for x, _ in items])
+                started = time.perf_counter()
+                result = run_blocking(handle.model.predict, batch)
+                elapsed = time.perf_counter() - started
+                for i, (_, future) in enumerate(items):
+                    future.set_result(result[i])
+                with self._stats_lock:
+                    self._batches += 1
+                    self._items += len(items)
+                    self._batch_sizes[len(items)] += 1
+                    self._inference_seconds += elapsed
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'errors': self._errors,
+                'avg_batch_size': round(self._items / self._batches, 3) if self._batches else 0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'inference_seconds_total': round(self._inference_seconds, 4),
+            }
+
+inference_batcher = InferenceBatcher(model_registry)
@@ -0,0 +1,70 @@
+from typing import List
+
+from sqlalchemy import case
+
+from app.models import BloodRequest
+
+BLOOD_GROUPS = ['A+', 'A-', 'AB+', 'AB-', 'B+', 'B-', 'O+', 'O-']
+BIT = {group: 1 << i for i, group in enumerate(BLOOD_GROUPS)}
+
+# Distance bands (km) used to rank matches: nearer band first, then most urgent
+MATCH_DISTANCE_BANDS_KM = (5, 15, 50)
+
+def _antigens(group: str) -> set:
+    """Red cell antigens carried by a blood group, e.g. 'AB-' -> {'A', 'B'}"""
+    abo, rh = group[:-1], group[-1]
+    antigens = set() if abo == 'O' else set(abo)
+    if rh == '+':
+        antigens.add('D')
+    return antigens
+
+def _can_donate(donor: str, recipient: str) -> bool:
+    # A donor's red cells are safe when they carry no antigen the recipient lacks
+    return _antigens(donor) <= _antigens(recipient)
+
+# Precomputed compatibility matrix as bitmasks over BLOOD_GROUPS
+DONATES_TO = {
+    donor: sum(BIT[recipient] for recipient in BLOOD_GROUPS if _can_donate(donor, recipient))
+    for donor in BLOOD_GROUPS
+}
+RECEIVES_FROM = {
+    recipient: sum(BIT[donor] for donor in BLOOD_GROUPS if _can_donate(donor, recipient))
+    for recipient in BLOOD_GROUPS
+}
+
+def groups_in(mask: int) -> List[str]:
+    return [group for group in BLOOD_GROUPS if mask & BIT[group]]
+
+def normalize_group(group: str) -> str:
+    """Canonical blood group string; raises ValueError for anything else"""
+    normalized = (group or '').replace(' ', '+').strip().upper()  # '+' often arrives as ' ' in query strings
+    if normalized not in BIT:
+        raise ValueError(f"Unknown blood group: {group}")
+    return normalized
+
+def recipient_groups(donor_group: str) -> List[str]:
+    """Request blood groups a donor of donor_group can fulfil"""
+    return groups_in(DONATES_TO[normalize_group(donor_group)])
+
+def donor_groups(recipient_group: str) -> List[str]:
+    """Donor blood groups that can fulfil a request for recipient_group"""
+    return groups_in(RECEIVES_FROM[normalize_group(recipient_group)])
+
+def can_donate(donor_group: str, recipient_group: str) -> bool:
+    return bool(DONATES_TO[normalize_group(donor_group)] & BIT[normalize_group(recipient_group)])
+
+def distance_band(dist_sq):
+    """SQL expression: 0, 1, 2 ... for each MATCH_DISTANCE_BANDS_KM band of a squared distance"""
+    whens = [(dist_sq <= km * km, i) for i, km in enumerate(MATCH_DISTANCE_BANDS_KM)]
+    return case(*whens, else_=len(MATCH_DISTANCE_BANDS_KM))
+
+def band_of(distance_km: float) -> int:
+    """Python counterpart of distance_band for already computed distances"""
+    for i, km in enumerate(MATCH_DISTANCE_BANDS_KM):
+        if distance_km <= km:
+            return i
+    return len(MATCH_DISTANCE_BANDS_KM)
+
+def compatible_filter(donor_group: str):
+    """SQL filter: open requests whose blood group the donor can fulfil (uses the blood_group index)"""
+    return BloodRequest.blood_group.in_(recipient_groups(donor_group))
@@ -0,0 +1,203 @@
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency buckets in seconds (upper bounds); +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+PREFIX = 'bloodclan'
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, keyed by a label tuple"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = dict(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", dict(base, le='+Inf' if bound == float('inf') else repr(bound)), cumulative
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, count
+
+class Metrics:
+    """
+    Process-wide instrumentation: per-stage and per-request histograms, SQL
+    statement counts per request, and stats() of the other services exposed
+    as gauges. Rendered in the Prometheus text format by GET /metrics.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.stage_seconds = Histogram(
+            f'{PREFIX}_stage_seconds', 'Time spent in one stage of an endpoint', ('endpoint', 'stage'))
+        self.request_seconds = Histogram(
+            f'{PREFIX}_request_seconds', 'Request latency', ('endpoint', 'method', 'status'))
+        self.sql_statements = Histogram(
+            f'{PREFIX}_sql_statements_per_request', 'SQL statements executed per request', ('endpoint',),
+            buckets=COUNT_BUCKETS)
+        self._collectors = {}
+        self._sql_listener = False
+        self.profile_dir = 'profiles'
+        self.profile_sample_rate = 0.0
+        self.profile_slow_ms = 1000
+        self.profile_token = None
+        self.profiles_written = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.profile_dir = app.config.get('PROFILE_DIR', self.profile_dir)
+        self.profile_sample_rate = app.config.get('PROFILE_SAMPLE_RATE', self.profile_sample_rate)
+        self.profile_slow_ms = app.config.get('PROFILE_SLOW_MS', self.profile_slow_ms)
+        self.profile_token = app.config.get('PROFILE_TOKEN')
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not self._sql_listener:
+            # Class-level listener: covers every engine, including ones created later
+            event.listen(Engine, 'before_cursor_execute', self._count_statement)
+            self._sql_listener = True
+
+    def register_collector(self, name, stats_fn):
+        """Expose the numeric fields of stats_fn() as {PREFIX}_{name}_{field} gauges"""
+        self._collectors[name] = stats_fn
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as one stage of the current endpoint"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            endpoint = (request.endpoint or 'unknown') if has_request_context() else 'background'
+            self.stage_seconds.observe(time.perf_counter() - started, endpoint, name)
+
+    def _count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.metrics_sql_count = g.get('metrics_sql_count', 0) + 1
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_count = 0
+        if self._should_profile():
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.metrics_profiler = profiler
+            except ValueError:
+                # Another profiler is already active in this thread
+                pass
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        self.request_seconds.observe(elapsed, endpoint, request.method, str(response.status_code))
+        self.sql_statements.observe(g.pop('metrics_sql_count', 0), endpoint)
+
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            forced = self._profile_requested()
+            if forced or elapsed * 1000 >= self.profile_slow_ms:
+                path = self._save_profile(profiler, endpoint, elapsed)
+                if forced:
+                    response.headers['X-Profile-Path'] = path
+        return response
+
+    def _profile_requested(self):
+        """Explicit ?profile=1 with the right X-Profile-Token"""
+        return (bool(self.profile_token) and request.args.get('profile') == '1'
+                and request.headers.get('X-Profile-Token') == self.profile_token)
+
+    def _should_profile(self):
+        """Explicit ?profile=1 with the right X-Profile-Token, or a random sample of requests"""
+        if self.profile_token and request.args.get('profile') == '1':
+            return self._profile_requested()
+        return self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+
+    def _save_profile(self, profiler, endpoint, elapsed):
+        # .prof files open in snakeviz or convert to flame graphs with flameprof
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{endpoint}-{int(time.time() * 1000)}-{int(elapsed * 1000)}ms.prof")
+        profiler.dump_stats(path)
+        self.profiles_written += 1
+        return path
+
+    def _gauges(self):
+        for name, stats_fn in sorted(self._collectors.items()):
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            yield from _flatten(f'{PREFIX}_{name}', stats)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for histogram in (self.stage_seconds, self.request_seconds, self.sql_statements):
+            lines.append(f"# HELP {histogram.name} {histogram.help}")
+            lines.append(f"# TYPE {histogram.name} histogram")
+            for name, labels, value in histogram.samples():
+                lines.append(f"{name}{_labels(labels)} {value}")
+        for name, value in self._gauges():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        lines.append(f"# TYPE {PREFIX}_profiles_written counter")
+        lines.append(f"{PREFIX}_profiles_written {self.profiles_written}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+def _flatten(prefix, stats):
+    """Numeric leaves of a (nested) stats dict; booleans become 0/1, everything else is skipped"""
+    for key, value in stats.items():
+        name = f"{prefix}_{key}".replace('-', '_').replace('.', '_')
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+metrics = Metrics()
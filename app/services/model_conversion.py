@@ -0,0 +1,145 @@
+import glob
+import os
+import time
+
+import numpy as np
+
+from app.services.inference_backends import load_backend
+from app.services.model_service import INPUT_SHAPE, LABELS
+from app.services.preprocessing import decode_into
+
+QUANTIZATIONS = ('none', 'float16', 'int8')
+
+def find_images(directory, extensions, limit=None):
+    """Image files under directory (recursive), sorted so runs are reproducible"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(directory, '**', '*'), recursive=True)
+        if os.path.isfile(path) and path.rsplit('.', 1)[-1].lower() in extensions
+    )
+    return paths[:limit] if limit else paths
+
+def load_inputs(paths):
+    """(N, 256, 256, 3) float32 inputs preprocessed exactly like /api/model/predict, plus the files that decoded"""
+    inputs = np.empty((len(paths),) + INPUT_SHAPE, dtype=np.float32)
+    decoded = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                decode_into(f.read(), inputs[len(decoded)])
+        except Exception:
+            continue
+        decoded.append(path)
+    return inputs[:len(decoded)], decoded
+
+def convert_to_tflite(keras_path, out_path, quantization='float16', calibration=None):
+    """
+    Convert the Keras .h5 to TFLite. float16 halves the weights with no
+    calibration; int8 quantizes weights and activations and needs calibration,
+    an array of preprocessed fingerprints covering the real input range.
+    Input and output tensors stay float32 either way.
+    """
+    import tensorflow as tf
+    from keras.models import load_model
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_model(keras_path))
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if calibration is None or not len(calibration):
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for x in calibration:
+                yield [x[np.newaxis, ...]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(out_path, 'wb') as f:
+        f.write(converter.convert())
+    return out_path
+
+def convert_to_onnx(keras_path, out_path, opset=13):
+    """Convert the Keras .h5 to ONNX (needs tf2onnx); served by onnxruntime"""
+    import tensorflow as tf
+    import tf2onnx
+    from keras.models import load_model
+
+    model = load_model(keras_path)
+    signature = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=out_path)
+    return out_path
+
+def _timed_scores(model, inputs, batch_size):
+    scores, per_image_ms = [], []
+    for start in range(0, len(inputs), batch_size):
+        batch = inputs[start:start + batch_size]
+        started = time.perf_counter()
+        scores.append(np.asarray(model.predict(batch), dtype=np.float32))
+        per_image_ms.extend([(time.perf_counter() - started) * 1000 / len(batch)] * len(batch))
+    return np.concatenate(scores), per_image_ms
+
+def _latency(per_image_ms):
+    values = sorted(per_image_ms)
+    def percentile(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))], 3)
+    return {'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'mean_ms': round(sum(values) / len(values), 3)}
+
+def accuracy_report(baseline_path, candidate, candidate_path, inputs, names=None, threshold=0.65,
+                    batch_size=16, max_examples=20):
+    """
+    Run the Keras baseline and a candidate backend over the same inputs and
+    compare them: how often the predicted group differs, how far confidences
+    move, and how many images land on the other side of PREDICT_THRESHOLD
+    (allowed_to_donate would change). Also reports per-image latency and the
+    size of each model file.
+    """
+    names = names or [str(i) for i in range(len(inputs))]
+    baseline_model = load_backend('keras', baseline_path)
+    candidate_model = load_backend(candidate, candidate_path)
+    # Warm both so the first batch doesn't count graph building
+    warmup = np.zeros((1,) + INPUT_SHAPE, dtype=np.float32)
+    baseline_model.predict(warmup)
+    candidate_model.predict(warmup)
+
+    base_scores, base_ms = _timed_scores(baseline_model, inputs, batch_size)
+    cand_scores, cand_ms = _timed_scores(candidate_model, inputs, batch_size)
+
+    base_class = base_scores.argmax(axis=1)
+    cand_class = cand_scores.argmax(axis=1)
+    rows = np.arange(len(inputs))
+    base_conf = base_scores[rows, base_class]
+    cand_conf = cand_scores[rows, cand_class]
+    conf_delta = np.abs(cand_conf - base_conf)
+    flips = (base_conf >= threshold) != (cand_conf >= threshold)
+    differs = (base_class != cand_class) | flips
+
+    examples = []
+    # Largest confidence changes first
+    for i in sorted(np.flatnonzero(differs), key=lambda i: -conf_delta[i])[:max_examples]:
+        examples.append({
+            'image': names[i],
+            'baseline': {'group': LABELS[base_class[i]], 'confidence': round(float(base_conf[i]), 4)},
+            'candidate': {'group': LABELS[cand_class[i]], 'confidence': round(float(cand_conf[i]), 4)},
+        })
+
+    images = len(inputs)
+    return {
+        'images': images,
+        'backend': candidate,
+        'threshold': threshold,
+        'group_agreement': round(float((base_class == cand_class).mean()), 4) if images else None,
+        'group_mismatches': int((base_class != cand_class).sum()),
+        'threshold_flips': int(flips.sum()),
+        'confidence_delta': {
+            'mean': round(float(conf_delta.mean()), 5) if images else None,
+            'max': round(float(conf_delta.max()), 5) if images else None,
+        },
+        'baseline': {'path': baseline_path, 'bytes': os.path.getsize(baseline_path), **_latency(base_ms)},
+        'candidate': {'path': candidate_path, 'bytes': os.path.getsize(candidate_path), **_latency(cand_ms)},
+        'mismatches': examples,
+    }
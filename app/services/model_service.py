@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from app.services.inference_backends import EXTENSIONS, load_backend
+
+# Class index -> blood group, in the order the ResNet was trained on
+LABELS = ['A+', 'A-', 'AB+', 'AB-', 'B+', 'B-', 'O+', 'O-']
+INPUT_SHAPE = (256, 256, 3)
+
+# Immutable snapshot of a loaded model. Requests grab one handle and use it
+# for the whole prediction, so swapping in a new handle never pulls the model
+# out from under an in-flight request. model is an inference backend: call
+# model.predict(batch) for (N, len(LABELS)) class scores.
+ModelHandle = namedtuple(
+    "ModelHandle",
+    ["model", "backend", "version", "path", "mtime", "warmup_seconds", "loaded_at"]
+)
+
+def configure_threads(intra_op: int = 0, inter_op: int = 0):
+    """
+    Set the CPU thread budget for TensorFlow (0 keeps TF's default).
+    Must run before the first model is built in this process.
+    """
+    if not intra_op and not inter_op:
+        return
+    import tensorflow as tf
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError:
+        # TF runtime already initialised, the budget can no longer change
+        pass
+
+def file_version(path: str) -> str:
+    """Short content hash of the model file, used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def artifact_path(model_path: str, backend: str) -> str:
+    """Where convert-model writes the backend's model next to the Keras .h5 by default"""
+    if backend == 'keras':
+        return model_path
+    return os.path.splitext(model_path)[0] + EXTENSIONS[backend]
+
+class ModelRegistry:
+    """Keeps one loaded copy of the blood group model per worker process"""
+
+    def __init__(self):
+        self._handle = None
+        self._pid = None
+        self._load_lock = threading.Lock()
+        self._model_path = None
+        self._backend = 'keras'
+        self._reload_check_seconds = 0
+        self._intra_op_threads = 0
+        self._inter_op_threads = 0
+        self._last_check = 0.0
+        self.last_error = None
+
+    def init_app(self, app):
+        # Only records settings: TensorFlow is imported on first load, so
+        # CLI commands and request-only workers never pay for it
+        self._backend = app.config.get('INFERENCE_BACKEND', 'keras')
+        self._model_path = app.config.get('INFERENCE_MODEL_PATH') or artifact_path(
+            app.config.get('MODEL_PATH'), self._backend)
+        self._reload_check_seconds = app.config.get('MODEL_RELOAD_CHECK_SECONDS', 0)
+        self._intra_op_threads = app.config.get('INFERENCE_INTRA_OP_THREADS', 0)
+        self._inter_op_threads = app.config.get('INFERENCE_INTER_OP_THREADS', 0)
+        app.extensions['model_registry'] = self
+
+    def load_on_startup(self, app):
+        """Load and warm the model in a serving process (e.g. a gunicorn worker after fork)"""
+        if not app.config.get('MODEL_LOAD_ON_STARTUP', True):
+            return
+        try:
+            self.load()
+        except Exception as e:
+            app.logger.error(f"Model not loaded at startup: {str(e)}")
+
+    @property
+    def handle(self):
+        return self._handle
+
+    def load(self, path=None):
+        """Load (or reload) the model from disk, warm it up and swap it in"""
+        path = path or self._model_path
+        if not path or not os.path.exists(path):
+            self.last_error = f"Model file not found at path: {path}"
+            raise FileNotFoundError(self.last_error)
+
+        with self._load_lock:
+            mtime = os.path.getmtime(path)
+            current = self._handle
+            if current and current.path == path and current.mtime == mtime and self._pid == os.getpid():
+                return current
+
+            if self._backend == 'keras':
+                configure_threads(self._intra_op_threads, self._inter_op_threads)
+
+            # Build and warm the new model before anyone can see it
+            model = load_backend(self._backend, path, self._intra_op_threads)
+            started = time.perf_counter()
+            model.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))
+            warmup_seconds = time.perf_counter() - started
+
+            self._handle = ModelHandle(
+                model=model,
+                backend=self._backend,
+                version=file_version(path),
+                path=path,
+                mtime=mtime,
+                warmup_seconds=round(warmup_seconds, 4),
+                loaded_at=datetime.utcnow(),
+            )
+            self._pid = os.getpid()
+            self._model_path = path
+            self.last_error = None
+            return self._handle
+
+    def get(self):
+        """Return the current model handle, loading or hot-swapping if needed"""
+        handle = self._handle
+        if handle is None or self._pid != os.getpid():
+            # Never reuse a TF model inherited across fork(); build our own
+            return self.load()
+
+        # Throttled check for a replaced .h5 file
+        now = time.monotonic()
+        if self._reload_check_seconds and now - self._last_check >= self._reload_check_seconds:
+            self._last_check = now
+            try:
+                if os.path.getmtime(self._model_path) != handle.mtime:
+                    handle = self.load()
+            except Exception as e:
+                # Keep serving the model we already have
+                self.last_error = str(e)
+        return handle
+
+    def status(self):
+        handle = self._handle if self._pid == os.getpid() else None
+        return {
+            'model_loaded': handle is not None,
+            'model_version': handle.version if handle else None,
+            'backend': handle.backend if handle else self._backend,
+            'model_path': handle.path if handle else self._model_path,
+            'warmup_seconds': handle.warmup_seconds if handle else None,
+            'loaded_at': handle.loaded_at.isoformat() if handle else None,
+            'error': self.last_error,
+        }
+
+model_registry = ModelRegistry()
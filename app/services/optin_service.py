@@ -0,0 +1,89 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import BloodRequest, DonorOptIn, db
+
+# status: 'created', 'duplicate' (this donor already opted in), 'closed' or 'not_found'.
+# request is a row with id, blood_group, lat, lng, units_needed, units_pledged and is_open
+# (None when not_found); closed_now is True for the opt-in that fulfilled the request.
+OptInResult = namedtuple("OptInResult", ["status", "donor_id", "request", "closed_now"])
+
+_REQUEST_COLUMNS = (BloodRequest.id, BloodRequest.blood_group, BloodRequest.lat, BloodRequest.lng,
+                    BloodRequest.units_needed, BloodRequest.units_pledged, BloodRequest.is_open)
+
+def pledge_update(units=1):
+    """
+    UPDATE adding units to blood_requests.units_pledged, closing the request
+    in the same statement once units_needed is reached. SET expressions read
+    the row's old values, so concurrent pledges can't both see it unfilled.
+    """
+    pledged = BloodRequest.units_pledged + units
+    return update(BloodRequest).values(
+        units_pledged=pledged,
+        is_open=case((pledged >= func.coalesce(BloodRequest.units_needed, 1), False), else_=BloodRequest.is_open)
+    ).execution_options(synchronize_session=False)
+
+def _request_row(request_id):
+    return db.session.execute(select(*_REQUEST_COLUMNS).where(BloodRequest.id == request_id)).first()
+
+def _existing_optin(request_id, donor_contact):
+    return db.session.execute(
+        select(DonorOptIn.id).where(DonorOptIn.request_id == request_id, DonorOptIn.donor_contact == donor_contact)
+    ).scalar()
+
+def _duplicate_or_rejected(request_id, donor_contact):
+    # Retries of an accepted opt-in stay successful, even once the request has closed
+    existing = _existing_optin(request_id, donor_contact)
+    req = _request_row(request_id)
+    if existing:
+        return OptInResult('duplicate', existing, req, False)
+    return OptInResult('closed' if req else 'not_found', None, req, False)
+
+def register_optin(request_id, donor: dict, now=None) -> OptInResult:
+    """
+    Record one donor opt-in and pledge one unit, in a single transaction:
+    a conditional UPDATE that only matches an open, unexpired request takes
+    the row lock, counts the pledge and closes the request when it is
+    fulfilled, then the DonorOptIn row is inserted. The unique
+    (request_id, donor_contact) constraint turns a racing retry into a
+    rollback, reported as 'duplicate' with the original donor id.
+    """
+    now = now or datetime.utcnow()
+    contact = donor['donor_contact']
+
+    # Cheap check first: a plain retry shouldn't queue on the request's row lock
+    existing = _existing_optin(request_id, contact)
+    if existing:
+        db.session.rollback()
+        return OptInResult('duplicate', existing, _request_row(request_id), False)
+
+    try:
+        pledged = db.session.execute(
+            pledge_update().where(
+                BloodRequest.id == request_id,
+                BloodRequest.is_open == True,
+                or_(BloodRequest.expires_at.is_(None), BloodRequest.expires_at > now)
+            )
+        ).rowcount
+        if not pledged:
+            db.session.rollback()
+            return _duplicate_or_rejected(request_id, contact)
+
+        optin = DonorOptIn(request_id=request_id, **donor)
+        db.session.add(optin)
+        db.session.flush()
+        donor_id = optin.id
+        req = _request_row(request_id)
+        db.session.commit()
+    except IntegrityError:
+        # Same donor committed between the check and the insert; the pledge is rolled back too
+        db.session.rollback()
+        result = _duplicate_or_rejected(request_id, contact)
+        if result.status != 'duplicate':
+            raise
+        return result
+
+    return OptInResult('created', donor_id, req, not req.is_open)
@@ -0,0 +1,191 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import PredictionCacheEntry, db
+
+def image_hash(file_data: bytes) -> str:
+    return hashlib.sha256(file_data).hexdigest()
+
+class PredictionCache:
+    """
+    Two-tier cache of (blood group, confidence) keyed by image hash + model version.
+    Tier 1 is an in-process LRU with size and TTL eviction; tier 2 is the
+    prediction_cache table, shared by every worker. Rows past the TTL are
+    deleted by purge_expired(), which the expiry sweeper runs on every tick.
+    """
+
+    def __init__(self, max_size=2048, ttl_seconds=24 * 3600, shared=True):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = None
+        self._stale_versions = False
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.purged = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PREDICTION_CACHE_ENABLED', True)
+        self.max_size = app.config.get('PREDICTION_CACHE_MAX_SIZE', self.max_size)
+        self.ttl_seconds = app.config.get('PREDICTION_CACHE_TTL_SECONDS', self.ttl_seconds)
+        self.shared = app.config.get('PREDICTION_CACHE_SHARED', self.shared)
+        app.extensions['prediction_cache'] = self
+
+    def _check_version(self, model_version):
+        # A new model file makes every cached prediction stale
+        if model_version != self._model_version:
+            with self._lock:
+                if model_version != self._model_version:
+                    self._entries.clear()
+                    self._stale_versions = self._model_version is not None
+                    self._model_version = model_version
+
+    def _purge_stale_shared(self):
+        if not self._stale_versions:
+            return
+        self._stale_versions = False
+        with db.engine.begin() as conn:
+            conn.execute(
+                delete(PredictionCacheEntry).where(PredictionCacheEntry.model_version != self._model_version)
+            )
+
+    def get(self, key: str, model_version: str):
+        """Return (predicted_group, confidence) or None"""
+        if not self.enabled:
+            return None
+        self._check_version(model_version)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared:
+            try:
+                self._purge_stale_shared()
+                cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+                with db.engine.connect() as conn:
+                    row = conn.execute(
+                        select(PredictionCacheEntry.predicted_group, PredictionCacheEntry.confidence).where(
+                            PredictionCacheEntry.image_hash == key,
+                            PredictionCacheEntry.model_version == model_version,
+                            PredictionCacheEntry.created_at >= cutoff
+                        )
+                    ).first()
+                if row is not None:
+                    value = (row[0], row[1])
+                    self._remember(key, value)
+                    with self._lock:
+                        self.shared_hits += 1
+                    return value
+            except Exception as e:
+                # The shared tier is best effort; fall through to a miss
+                current_app.logger.warning(f"Prediction cache lookup failed: {str(e)}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key: str, model_version: str, predicted_group: str, confidence: float):
+        if not self.enabled:
+            return
+        self._check_version(model_version)
+        self._remember(key, (predicted_group, confidence))
+
+        if self.shared:
+            try:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+                with db.engine.begin() as conn:
+                    # Replace an expired row for the same key, if any
+                    conn.execute(delete(PredictionCacheEntry).where(
+                        PredictionCacheEntry.image_hash == key,
+                        PredictionCacheEntry.model_version == model_version,
+                        PredictionCacheEntry.created_at < cutoff
+                    ))
+                    conn.execute(insert(PredictionCacheEntry).values(
+                        image_hash=key,
+                        model_version=model_version,
+                        predicted_group=predicted_group,
+                        confidence=confidence,
+                        created_at=datetime.utcnow()
+                    ))
+            except IntegrityError:
+                # Another worker cached the same image first
+                pass
+            except Exception as e:
+                current_app.logger.warning(f"Prediction cache write failed: {str(e)}")
+
+    def purge_expired(self, now=None, chunk_size=1000):
+        """Delete shared rows older than the TTL in chunks of chunk_size; returns the number deleted"""
+        if not self.shared:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=self.ttl_seconds)
+        deleted = 0
+        while True:
+            with db.engine.begin() as conn:
+                ids = conn.execute(
+                    select(PredictionCacheEntry.id)
+                    .where(PredictionCacheEntry.created_at < cutoff)
+                    .limit(chunk_size)
+                ).scalars().all()
+                if ids:
+                    conn.execute(delete(PredictionCacheEntry).where(PredictionCacheEntry.id.in_(ids)))
+            deleted += len(ids)
+            if len(ids) < chunk_size:
+                break
+        with self._lock:
+            self.purged += deleted
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'shared': self.shared,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'model_version': self._model_version,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'purged': self.purged,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,229 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, case, func, or_
+
+from app.models import BloodRequest
+from app.services.geo_service import (KM_PER_DEGREE_LAT, approx_error_margin, bounding_box, coordinate_arrays,
+                                      distances_from, haversine_np)
+from app.services.spatial_index import covering_cells, spatial_index
+from app.services.matching_service import band_of, distance_band, recipient_groups
+from app.services.metrics import metrics
+
+# How list_open_requests narrows a radius search:
+#   bbox   - lat/lng range on the (lat, lng) index
+#   grid   - geo_cell IN (cells covering the radius) on the geo_cell index
+#   memory - in-process SpatialIndex, then fetch the page by primary key
+SPATIAL_STRATEGIES = ('bbox', 'grid', 'memory')
+
+MAX_PER_PAGE = 100
+# Most ring ids excluded with NOT IN; past this (SQL Server takes at most 2100
+# parameters per statement) the edge is checked on the page instead
+MAX_EXCLUDED_IDS = 500
+# Stand-in for "never expires" so urgency ordering and cursors never see NULL
+NO_EXPIRY = datetime(9999, 12, 31)
+
+def open_requests_query(now=None):
+    """Open requests that haven't expired"""
+    now = now or datetime.utcnow()
+    return BloodRequest.query.filter(
+        BloodRequest.is_open == True,
+        or_(BloodRequest.expires_at.is_(None), BloodRequest.expires_at > now)
+    )
+
+def approx_distance_sq(lat: float, lng: float):
+    """
+    Squared equirectangular distance (km^2) as a SQL expression. Only uses
+    arithmetic, so it runs on SQL Server and SQLite alike; the cosine is a
+    constant computed here for the user's latitude. Within
+    approx_error_margin() of haversine, see outside_radius_ids().
+    """
+    kx = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+    dy = (BloodRequest.lat - lat) * KM_PER_DEGREE_LAT
+    # Shorter way round, so radii across the antimeridian work
+    dlng = BloodRequest.lng - lng
+    dlng = case((dlng > 180, dlng - 360), (dlng < -180, dlng + 360), else_=dlng)
+    dx = dlng * kx
+    return dy * dy + dx * dx
+
+def outside_radius_ids(query, lat, lng, radius_km, in_box):
+    """
+    Ids that the SQL approximation counts as inside radius_km but that are
+    outside it by haversine. Only the thin ring where the approximation can
+    be wrong is read (id, lat, lng) and checked exactly in Python. None when
+    there are more than MAX_EXCLUDED_IDS of them.
+    """
+    margin = approx_error_margin(lat, radius_km)
+    dist_sq = approx_distance_sq(lat, lng)
+    inner, outer = radius_km * (1 - margin), radius_km * (1 + margin)
+    ring = query.filter(in_box, dist_sq > inner * inner, dist_sq <= outer * outer).with_entities(
+        BloodRequest.id, BloodRequest.lat, BloodRequest.lng
+    ).all()
+    if not ring:
+        return []
+    ids, lats, lngs = zip(*ring)
+    exact = haversine_np(lat, lng, np.array(lats, dtype=np.float64), np.array(lngs, dtype=np.float64))
+    outside = [req_id for req_id, distance in zip(ids, exact.tolist()) if distance > radius_km]
+    return outside if len(outside) <= MAX_EXCLUDED_IDS else None
+
+def encode_cursor(values) -> str:
+    values = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in values]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _after(keys, values):
+    """Keyset predicate: rows strictly after `values` in the (column, descending) ordering `keys`"""
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        tie = [keys[j][0] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*tie, step))
+    return or_(*clauses)
+
+def _list_from_memory_index(blood_groups, lat, lng, radius_km, page, per_page, now, rank_by_urgency, columns=None):
+    """Radius search on the in-process SpatialIndex; only the page itself is read from SQL"""
+    spatial_index.sync(now)
+    with metrics.stage('distance'):
+        matches = spatial_index.radius(lat, lng, radius_km, blood_groups, now, include_unlocated=True)
+    if rank_by_urgency:
+        # Same ranking as the SQL path: distance band, soonest expiry, distance
+        matches.sort(key=lambda m: (
+            m[0] is None,
+            band_of(m[0]) if m[0] is not None else 0,
+            spatial_index.expires_at(m[1]) or NO_EXPIRY,
+            m[0] or 0.0,
+            m[1]
+        ))
+    start = (page - 1) * per_page
+    page_matches = matches[start:start + per_page]
+
+    ids = [req_id for _, req_id in page_matches]
+    page_query = open_requests_query(now).filter(BloodRequest.id.in_(ids))
+    if columns:
+        page_query = page_query.with_entities(*columns)
+    by_id = {req.id: req for req in page_query.all()} if ids else {}
+    rows = [(by_id[req_id], distance) for distance, req_id in page_matches if req_id in by_id]
+    return rows, len(matches), None
+
+def list_open_requests(blood_group=None, lat=None, lng=None, radius_km=15,
+                       page=1, per_page=10, cursor=None, now=None, strategy='bbox',
+                       compatible_with=None, columns=None):
+    """
+    Filtered, ordered and paginated open requests, all done in SQL.
+    Returns (rows, total, next_cursor) where rows are (BloodRequest, distance_km or None).
+    With `columns` (which must include id, lat and lng) only those are
+    selected and each row is a result row with attribute access instead of
+    a BloodRequest entity.
+
+    compatible_with=<donor group> lists every request that donor can fulfil
+    (not just the same group), ranked by distance band and then urgency.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+    if strategy not in SPATIAL_STRATEGIES:
+        raise ValueError(f"Unknown spatial index: {strategy}")
+
+    blood_groups = {blood_group} if blood_group else None
+    if compatible_with:
+        compatible = set(recipient_groups(compatible_with))
+        blood_groups = compatible & blood_groups if blood_groups else compatible
+
+    has_location = lat is not None and lng is not None
+    if has_location and strategy == 'memory' and not cursor:
+        return _list_from_memory_index(blood_groups, lat, lng, radius_km, page, per_page, now,
+                                       rank_by_urgency=bool(compatible_with), columns=columns)
+
+    query = open_requests_query(now)
+
+    if blood_groups is not None:
+        # Single group or the donor's compatible groups, on the blood_group index
+        query = query.filter(BloodRequest.blood_group.in_(sorted(blood_groups)))
+
+    outside = []
+    if has_location:
+        # Cheap indexed prefilter first, then the radius itself. The SQL
+        # distance is padded by its error margin, and the few ring rows that
+        # haversine puts outside the radius are excluded by id, so total and
+        # pages match the exact radius (and the memory strategy)
+        dist_sq = approx_distance_sq(lat, lng)
+        outer = radius_km * (1 + approx_error_margin(lat, radius_km))
+        cells = covering_cells(lat, lng, radius_km) if strategy == 'grid' else None
+        if cells:
+            in_box = BloodRequest.geo_cell.in_(cells)
+        else:
+            min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+            in_box = BloodRequest.lat.between(min_lat, max_lat)
+            if min_lng is not None:
+                in_box = and_(in_box, BloodRequest.lng.between(min_lng, max_lng))
+        outside = outside_radius_ids(query, lat, lng, radius_km, in_box)
+        if outside is None:
+            # Too many to bind: filter on the approximate radius and drop page rows past it below
+            in_radius = and_(in_box, dist_sq <= radius_km * radius_km)
+        else:
+            in_radius = and_(in_box, dist_sq <= outer * outer)
+            if outside:
+                in_radius = and_(in_radius, BloodRequest.id.notin_(outside))
+        # Requests without coordinates are still listed, after the located ones
+        no_location = or_(BloodRequest.lat.is_(None), BloodRequest.lng.is_(None))
+        query = query.filter(or_(no_location, in_radius))
+
+        missing = case((no_location, 1), else_=0)
+        distance = func.coalesce(dist_sq, 0.0)
+        if compatible_with:
+            keys = [(missing, False), (func.coalesce(distance_band(dist_sq), 0), False),
+                    (func.coalesce(BloodRequest.expires_at, NO_EXPIRY), False),
+                    (distance, False), (BloodRequest.id, False)]
+        else:
+            keys = [(missing, False), (distance, False), (BloodRequest.id, False)]
+    elif compatible_with:
+        # Most urgent first
+        keys = [(func.coalesce(BloodRequest.expires_at, NO_EXPIRY), False),
+                (BloodRequest.created_at, True), (BloodRequest.id, True)]
+    else:
+        keys = [(BloodRequest.created_at, True), (BloodRequest.id, True)]
+
+    # Exact total for the filter, without loading any rows
+    total = query.with_entities(func.count(BloodRequest.id)).scalar()
+
+    entities = columns or [BloodRequest]
+    ordered = query.with_entities(*entities, *[column for column, _ in keys]).order_by(
+        *[column.desc() if descending else column.asc() for column, descending in keys]
+    )
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("Invalid cursor")
+        ordered = ordered.filter(_after(keys, values))
+    else:
+        ordered = ordered.offset((page - 1) * per_page)
+
+    results = ordered.limit(per_page + 1).all()
+    has_more = len(results) > per_page
+    results = results[:per_page]
+
+    # Column rows keep the ordering keys as trailing (unnamed) columns; harmless to the caller
+    requests = [result if columns else result[0] for result in results]
+    distances = [None] * len(requests)
+    if has_location and requests:
+        # Exact distances for the page in one vectorised pass (NaN = no location)
+        page_distances = distances_from(lat, lng, *coordinate_arrays(requests)).tolist()
+        distances = [None if math.isnan(d) else d for d in page_distances]
+    rows = list(zip(requests, distances))
+    if has_location and outside is None:
+        # total is approximate by the few rows on the edge of the ring
+        rows = [(req, distance) for req, distance in rows if distance is None or distance <= radius_km]
+
+    next_cursor = None
+    if has_more and results:
+        next_cursor = encode_cursor(list(results[-1][len(entities):]))
+
+    return rows, total, next_cursor
@@ -0,0 +1,199 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models import CacheVersion, db
+
+CachedResponse = namedtuple("CachedResponse", ["version", "expires", "body", "etag", "mimetype"])
+
+# Query parameters holding coordinates; snapped to a grid so nearby users share entries
+LOCATION_PARAMS = ('lat', 'lng')
+
+class ResponseCache:
+    """
+    In-process cache of serialized GET responses for the requests API.
+
+    Entries are keyed by version + path + normalized query string; any
+    write (create, opt-in, expiry cleanup) bumps the version, which makes
+    every older entry a miss. With RESPONSE_CACHE_SHARED (the default) the
+    version is a row in cache_versions: each cached GET reads it with one
+    primary-key lookup and bump() increments it, so a write handled by one
+    gunicorn worker invalidates the entries of all of them. ETags are the
+    version plus a hash of the body, so they agree across workers and
+    If-None-Match gets a 304 from whichever worker answers. Without the
+    shared version a write handled by another worker is only picked up
+    after RESPONSE_CACHE_TTL_SECONDS.
+    """
+
+    NAME = 'requests'
+
+    def __init__(self, max_size=1024, ttl_seconds=30, geo_decimals=2, shared=True):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.geo_decimals = geo_decimals
+        self.shared = shared
+        self.enabled = True
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.max_size = app.config.get('RESPONSE_CACHE_MAX_SIZE', self.max_size)
+        self.ttl_seconds = app.config.get('RESPONSE_CACHE_TTL_SECONDS', self.ttl_seconds)
+        self.geo_decimals = app.config.get('RESPONSE_CACHE_GEO_DECIMALS', self.geo_decimals)
+        self.shared = app.config.get('RESPONSE_CACHE_SHARED', self.shared)
+        app.extensions['response_cache'] = self
+
+    def bump(self):
+        """Invalidate every cached response, in every worker (called after each committed write)"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+        if not self.shared:
+            return
+        try:
+            # Own transaction, so it never commits the caller's session
+            with db.engine.begin() as conn:
+                bumped = conn.execute(
+                    update(CacheVersion).where(CacheVersion.name == self.NAME)
+                    .values(version=CacheVersion.version + 1)
+                ).rowcount
+                if not bumped:
+                    conn.execute(CacheVersion.__table__.insert().values(name=self.NAME, version=1))
+        except IntegrityError:
+            # Another worker created the row first; its bump already invalidated everything
+            pass
+        except Exception as e:
+            current_app.logger.error(f"Failed to bump shared response cache version: {str(e)}")
+
+    def _current_version(self):
+        """The shared version (None if it can't be read: don't cache), else this worker's"""
+        if not self.shared:
+            return self.version
+        try:
+            version = db.session.execute(
+                select(CacheVersion.version).where(CacheVersion.name == self.NAME)
+            ).scalar() or 0
+        except Exception as e:
+            current_app.logger.error(f"Failed to read shared response cache version: {str(e)}")
+            db.session.rollback()
+            return None
+        with self._lock:
+            if version != self.version:
+                self.version = version
+                self._entries.clear()
+        return version
+
+    def bucket_location(self, lat, lng):
+        """Snap coordinates to the cache grid (2 decimals is ~1 km)"""
+        if not self.enabled or lat is None or lng is None:
+            return lat, lng
+        return round(lat, self.geo_decimals), round(lng, self.geo_decimals)
+
+    def _key(self, version):
+        params = []
+        for name in sorted(request.args):
+            values = request.args.getlist(name)
+            if name in LOCATION_PARAMS:
+                try:
+                    values = [round(float(v), self.geo_decimals) for v in values]
+                except ValueError:
+                    pass
+            params.append((name, tuple(values)))
+        return version, request.path, tuple(params)
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != self.version or entry.expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            if entry.version != self.version:
+                # A write landed while this response was being built
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _respond(self, entry):
+        if entry.etag in request.if_none_match:
+            self.not_modified += 1
+            response = make_response('', 304)
+        else:
+            response = make_response(entry.body)
+            response.mimetype = entry.mimetype
+        response.set_etag(entry.etag)
+        # Clients may keep the body but must revalidate it (cheap 304) every time
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def cached(self, view):
+        """Decorator for GET views: serve from cache and answer conditional requests"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+
+            version = self._current_version()
+            if version is None:
+                return view(*args, **kwargs)
+            key = self._key(version)
+            entry = self._get(key)
+            if entry is not None:
+                self.hits += 1
+                return self._respond(entry)
+
+            self.misses += 1
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = CachedResponse(
+                version=version,
+                expires=time.monotonic() + self.ttl_seconds,
+                body=body,
+                etag=f"{version}-{hashlib.sha1(body).hexdigest()}",
+                mimetype=response.mimetype
+            )
+            self._put(key, entry)
+            return self._respond(entry)
+        return wrapper
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'shared': self.shared,
+            'version': self.version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'not_modified': self.not_modified,
+            'evictions': self.evictions,
+        }
+
+response_cache = ResponseCache()
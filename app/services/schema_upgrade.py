@@ -0,0 +1,132 @@
+"""
+In-place upgrade of databases created by db.create_all() before a column,
+index or constraint was added to the models. create_all() only creates
+missing tables, so `flask upgrade-db` adds the rest and backfills it. Every
+step reads the live schema first, so it is safe to re-run.
+"""
+from sqlalchemy import bindparam, delete, func, inspect, select, text, update
+
+from app.models import BloodRequest, DonorOptIn, db
+from app.services.spatial_index import grid_cell
+
+BACKFILL_CHUNK_SIZE = 5000
+
+def _column_names(conn, table_name):
+    return {column['name'] for column in inspect(conn).get_columns(table_name)}
+
+def _index_names(conn, table_name):
+    inspector = inspect(conn)
+    names = {index['name'] for index in inspector.get_indexes(table_name)}
+    names.update(constraint['name'] for constraint in inspector.get_unique_constraints(table_name))
+    return names
+
+def _add_column(conn, column, ddl_suffix=''):
+    """ALTER TABLE ... ADD for a model column missing from the table; True if added"""
+    table = column.table
+    if column.name in _column_names(conn, table.name):
+        return False
+    preparer = conn.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=conn.dialect)
+    # ADD without COLUMN is accepted by SQL Server, SQLite and PostgreSQL alike
+    conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} "
+                      f"ADD {preparer.format_column(column)} {column_type}{ddl_suffix}"))
+    return True
+
+def _create_missing_indexes(conn):
+    """Model indexes (db.Index and index=True) missing from existing tables"""
+    created = []
+    existing_tables = set(inspect(conn).get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = _index_names(conn, table.name)
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in present:
+                index.create(bind=conn)
+                created.append(index.name)
+    return created
+
+def backfill_geo_cells(conn, chunk_size=BACKFILL_CHUNK_SIZE):
+    """Fill geo_cell for located requests inserted before the column existed"""
+    stmt = update(BloodRequest.__table__).where(
+        BloodRequest.__table__.c.id == bindparam('req_id')
+    ).values(geo_cell=bindparam('cell'))
+    filled, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(BloodRequest.id, BloodRequest.lat, BloodRequest.lng)
+            .where(BloodRequest.id > last_id, BloodRequest.geo_cell.is_(None),
+                   BloodRequest.lat.isnot(None), BloodRequest.lng.isnot(None))
+            .order_by(BloodRequest.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return filled
+        conn.execute(stmt, [{'req_id': req_id, 'cell': grid_cell(lat, lng)} for req_id, lat, lng in rows])
+        filled += len(rows)
+        last_id = rows[-1][0]
+
+def dedupe_optins(conn):
+    """
+    Delete repeated (request_id, donor_contact) opt-ins, keeping the first
+    (lowest id), so the unique constraint can be created. Missing contacts
+    count as one donor too, as SQL Server's unique constraint treats NULLs
+    as equal.
+    """
+    first = (select(func.min(DonorOptIn.id))
+             .group_by(DonorOptIn.request_id, DonorOptIn.donor_contact)
+             .scalar_subquery())
+    return conn.execute(delete(DonorOptIn.__table__).where(DonorOptIn.__table__.c.id.notin_(first))).rowcount
+
+def backfill_units_pledged(conn):
+    """units_pledged = the request's opt-in count, where they differ"""
+    requests = BloodRequest.__table__
+    optins = select(func.count(DonorOptIn.id)).where(DonorOptIn.request_id == requests.c.id).scalar_subquery()
+    return conn.execute(
+        update(requests).where(requests.c.units_pledged != optins).values(units_pledged=optins)
+    ).rowcount
+
+def _add_unique_constraint(conn, constraint):
+    """True if created; SQLite can't ALTER TABLE ... ADD CONSTRAINT, so it gets a unique index"""
+    table = constraint.table
+    if constraint.name in _index_names(conn, table.name):
+        return False
+    preparer = conn.dialect.identifier_preparer
+    columns = ", ".join(preparer.format_column(column) for column in constraint.columns)
+    if conn.dialect.name == 'sqlite':
+        conn.execute(text(f"CREATE UNIQUE INDEX {preparer.quote(constraint.name)} "
+                          f"ON {preparer.format_table(table)} ({columns})"))
+    else:
+        conn.execute(text(f"ALTER TABLE {preparer.format_table(table)} "
+                          f"ADD CONSTRAINT {preparer.quote(constraint.name)} UNIQUE ({columns})"))
+    return True
+
+def upgrade(log=print):
+    """Bring the live schema up to the models; each step runs in its own transaction"""
+    db.create_all()
+
+    with db.engine.begin() as conn:
+        if _add_column(conn, BloodRequest.__table__.c.geo_cell):
+            log("Added blood_requests.geo_cell")
+    with db.engine.begin() as conn:
+        filled = backfill_geo_cells(conn)
+        if filled:
+            log(f"Backfilled geo_cell for {filled} requests")
+
+    # Dedupe, recount and constrain in one transaction, so no opt-in lands in between
+    with db.engine.begin() as conn:
+        if _add_column(conn, BloodRequest.__table__.c.units_pledged, " NOT NULL DEFAULT 0"):
+            log("Added blood_requests.units_pledged")
+        removed = dedupe_optins(conn)
+        if removed:
+            log(f"Removed {removed} duplicate donor opt-ins")
+        recounted = backfill_units_pledged(conn)
+        if recounted:
+            log(f"Backfilled units_pledged for {recounted} requests")
+        constraint = next(c for c in DonorOptIn.__table__.constraints
+                          if c.name == 'uq_donor_optin_request_contact')
+        if _add_unique_constraint(conn, constraint):
+            log(f"Created unique constraint {constraint.name}")
+
+    with db.engine.begin() as conn:
+        for name in _create_missing_indexes(conn):
+            log(f"Created index {name}")
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+
+from flask import Response
+
+from app.models import BloodRequest, DonorOptIn
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder produces the same JSON, just slower
+    orjson = None
+
+# Field order of BloodRequest.to_dict / DonorOptIn.to_dict; responses keep it
+REQUEST_FIELDS = ('id', 'title', 'blood_group', 'units_needed', 'units_pledged', 'contact_name', 'contact_phone',
+                  'contact_email', 'address', 'lat', 'lng', 'created_at', 'expires_at', 'is_open', 'description',
+                  'donor_count')
+LIST_FIELDS = REQUEST_FIELDS + ('distance_km',)
+DONOR_FIELDS = ('id', 'request_id', 'donor_name', 'donor_contact', 'donor_blood_group', 'prediction_confidence',
+                'created_at')
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'item'):  # NumPy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload) -> bytes:
+    """JSON-encode with orjson when installed; datetimes become ISO 8601 either way"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+def json_response(payload, status=200) -> Response:
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+def parse_fields(value, allowed) -> tuple:
+    """?fields=a,b,c -> ('a', 'b', 'c') in the requested order; all of `allowed` when absent"""
+    if not value:
+        return tuple(allowed)
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def columns_for(model, fields, required=('id',)):
+    """Only the columns needed for `fields` (plus `required`), for query.with_entities()"""
+    names = dict.fromkeys(list(required) + [f for f in fields if hasattr(model, f)])
+    return [getattr(model, name) for name in names]
+
+def request_columns(fields):
+    # lat/lng are always read: the list endpoint computes distance_km from them
+    return columns_for(BloodRequest, fields, required=('id', 'lat', 'lng'))
+
+def donor_columns(fields):
+    return columns_for(DonorOptIn, fields)
+
+def request_row(row, fields, distance=None) -> dict:
+    """Response dict for a column-tuple row (same values as BloodRequest.to_dict)"""
+    item = {}
+    for field in fields:
+        if field == 'distance_km':
+            if distance is not None:
+                item['distance_km'] = round(distance, 2)
+        elif field in ('donor_count', 'units_pledged'):
+            item[field] = getattr(row, field) or 0
+        else:
+            item[field] = getattr(row, field)
+    return item
+
+def donor_row(row, fields) -> dict:
+    return {field: getattr(row, field) for field in fields}
+
+def iter_json_array(items, chunk_size=500):
+    """
+    Encode an iterable of JSON-able items as one JSON array, yielded in
+    chunks of chunk_size items so the full document is never built in memory
+    """
+    yield b'['
+    first = True
+    chunk = []
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) >= chunk_size:
+            yield (b',' if not first else b'') + b','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b',' if not first else b'') + b','.join(chunk)
+    yield b']'
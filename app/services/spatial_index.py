@@ -0,0 +1,286 @@
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.services.geo_service import KM_PER_DEGREE_LAT, bounding_box, distances_from, within_radius
+
+# Grid cell size in degrees (~5.5 km north-south). Requests store their cell
+# in BloodRequest.geo_cell so the database can seek on it as well.
+CELL_DEG = 0.05
+# Above this many cells a radius query falls back to the lat/lng bounding box
+MAX_SQL_CELLS = 64
+
+def cell_of(lat: float, lng: float, cell_deg: float = CELL_DEG) -> Tuple[int, int]:
+    return int(math.floor(lat / cell_deg)), int(math.floor(lng / cell_deg))
+
+def grid_cell(lat: Optional[float], lng: Optional[float], cell_deg: float = CELL_DEG) -> Optional[str]:
+    """Grid bucket key stored in BloodRequest.geo_cell"""
+    if lat is None or lng is None:
+        return None
+    row, col = cell_of(lat, lng, cell_deg)
+    return f"{row}:{col}"
+
+def covering_cells(lat: float, lng: float, radius_km: float, cell_deg: float = CELL_DEG,
+                   max_cells: int = MAX_SQL_CELLS) -> Optional[List[str]]:
+    """geo_cell keys covering a radius, or None if there are too many (or the box wraps)"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if min_lng is None:
+        return None
+    row_lo, col_lo = cell_of(min_lat, min_lng, cell_deg)
+    row_hi, col_hi = cell_of(max_lat, max_lng, cell_deg)
+    if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > max_cells:
+        return None
+    return [f"{row}:{col}" for row in range(row_lo, row_hi + 1) for col in range(col_lo, col_hi + 1)]
+
+class SpatialIndex:
+    """
+    In-memory grid index (spatial hash) over open requests. Radius and
+    k-nearest queries only visit the cells around the query point, and
+    requests can be added or removed one at a time.
+    """
+
+    # Outbox ids re-read on every sync, for close events committed out of id order
+    EVENT_OVERLAP = 100
+
+    def __init__(self, cell_deg: float = CELL_DEG, refresh_seconds: float = 300):
+        self.cell_deg = cell_deg
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._entries = {}     # id -> (lat, lng, blood_group, expires_at, created_at)
+        self._cells = {}       # (row, col) -> set of ids
+        self._unlocated = set()
+        self._max_id = 0
+        self._bounds = None    # (min_row, max_row, min_col, max_col) ever populated
+        self._built_at = None
+        self._last_event_id = None
+
+    def init_app(self, app):
+        self.refresh_seconds = app.config.get('SPATIAL_INDEX_REFRESH_SECONDS', self.refresh_seconds)
+        app.extensions['spatial_index'] = self
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._cells.clear()
+            self._unlocated.clear()
+            self._max_id = 0
+            self._bounds = None
+            self._built_at = None
+
+    def add(self, req_id, lat, lng, blood_group=None, expires_at=None, created_at=None):
+        with self._lock:
+            self.remove(req_id)
+            self._entries[req_id] = (lat, lng, blood_group, expires_at, created_at)
+            if lat is None or lng is None:
+                self._unlocated.add(req_id)
+            else:
+                row, col = cell_of(lat, lng, self.cell_deg)
+                self._cells.setdefault((row, col), set()).add(req_id)
+                if self._bounds is None:
+                    self._bounds = (row, row, col, col)
+                else:
+                    min_row, max_row, min_col, max_col = self._bounds
+                    self._bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+            self._max_id = max(self._max_id, req_id)
+
+    def add_request(self, req):
+        if req.is_open:
+            self.add(req.id, req.lat, req.lng, req.blood_group, req.expires_at, req.created_at)
+
+    def remove(self, req_id):
+        with self._lock:
+            entry = self._entries.pop(req_id, None)
+            if entry is None:
+                return
+            lat, lng = entry[0], entry[1]
+            if lat is None or lng is None:
+                self._unlocated.discard(req_id)
+                return
+            key = cell_of(lat, lng, self.cell_deg)
+            bucket = self._cells.get(key)
+            if bucket is not None:
+                bucket.discard(req_id)
+                if not bucket:
+                    del self._cells[key]
+
+    def expires_at(self, req_id):
+        entry = self._entries.get(req_id)
+        return entry[3] if entry else None
+
+    def _matches(self, entry, blood_groups, now):
+        if blood_groups is not None and entry[2] not in blood_groups:
+            return False
+        expires_at = entry[3]
+        return expires_at is None or expires_at > now
+
+    def _distances(self, lat, lng, ids):
+        """(ids, distances) as arrays, all distances computed in one NumPy pass"""
+        entries = self._entries
+        lats = np.fromiter((entries[req_id][0] for req_id in ids), dtype=np.float64, count=len(ids))
+        lngs = np.fromiter((entries[req_id][1] for req_id in ids), dtype=np.float64, count=len(ids))
+        return np.asarray(ids, dtype=np.int64), distances_from(lat, lng, lats, lngs)
+
+    def _cell_size_km(self, lat):
+        height = self.cell_deg * KM_PER_DEGREE_LAT
+        width = height * max(math.cos(math.radians(min(abs(lat), 89.9))), 1e-6)
+        return height, width
+
+    def _cells_in_box(self, lat, lng, radius_km):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        row_lo = math.floor(min_lat / self.cell_deg)
+        row_hi = math.floor(max_lat / self.cell_deg)
+        if min_lng is None:
+            # Pole or antimeridian: every populated cell in the latitude band
+            return [key for key in self._cells if row_lo <= key[0] <= row_hi]
+        col_lo = math.floor(min_lng / self.cell_deg)
+        col_hi = math.floor(max_lng / self.cell_deg)
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self._cells):
+            # Huge radius: cheaper to walk the populated cells
+            return [key for key in self._cells
+                    if row_lo <= key[0] <= row_hi and col_lo <= key[1] <= col_hi]
+        return [(row, col) for row in range(row_lo, row_hi + 1) for col in range(col_lo, col_hi + 1)]
+
+    def radius(self, lat, lng, radius_km, blood_groups=None, now=None, include_unlocated=False):
+        """
+        [(distance_km, id)] within radius_km, nearest first. Unlocated requests
+        (no coordinates) are appended as (None, id) when include_unlocated is set.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            ids = [req_id for key in self._cells_in_box(lat, lng, radius_km)
+                   for req_id in self._cells.get(key, ())
+                   if self._matches(self._entries[req_id], blood_groups, now)]
+            ids_arr, distances = self._distances(lat, lng, ids)
+            mask = within_radius(distances, radius_km)
+            results = sorted(zip(distances[mask].tolist(), ids_arr[mask].tolist()))
+            if include_unlocated:
+                results.extend((None, req_id) for req_id in sorted(self._unlocated)
+                               if self._matches(self._entries[req_id], blood_groups, now))
+        return results
+
+    def nearest(self, lat, lng, k, max_km=None, blood_groups=None, now=None):
+        """[(distance_km, id)] of the k nearest requests, expanding ring by ring"""
+        now = now or datetime.utcnow()
+        center_row, center_col = cell_of(lat, lng, self.cell_deg)
+        heap = []  # max-heap of the best k as (-distance, id)
+
+        def consider(ids):
+            ids = [req_id for req_id in ids if self._matches(self._entries[req_id], blood_groups, now)]
+            ids_arr, distances = self._distances(lat, lng, ids)
+            if max_km is not None:
+                mask = within_radius(distances, max_km)
+                ids_arr, distances = ids_arr[mask], distances[mask]
+            for distance, req_id in zip(distances.tolist(), ids_arr.tolist()):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, req_id))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, req_id))
+
+        with self._lock:
+            if not self._cells or k <= 0:
+                return []
+            min_row, max_row, min_col, max_col = self._bounds
+            max_ring = max(center_row - min_row, max_row - center_row,
+                           center_col - min_col, max_col - center_col, 0)
+            ring = 0
+            while ring <= max_ring:
+                if 8 * ring > len(self._cells):
+                    # Sparse data far away: scanning populated cells is cheaper than more rings
+                    heap.clear()
+                    consider([req_id for bucket in self._cells.values() for req_id in bucket])
+                    break
+                consider([req_id for key in self._ring(center_row, center_col, ring)
+                          for req_id in self._cells.get(key, ())])
+                # Everything within `ring` full cells of the centre has been seen
+                height, width = self._cell_size_km(lat + math.copysign(ring * self.cell_deg, lat))
+                covered_km = ring * min(height, width)
+                if len(heap) == k and -heap[0][0] <= covered_km:
+                    break
+                if max_km is not None and covered_km >= max_km:
+                    break
+                ring += 1
+        return sorted((-d, req_id) for d, req_id in heap)
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            return [(row, col)]
+        keys = [(row - ring, c) for c in range(col - ring, col + ring + 1)]
+        keys += [(row + ring, c) for c in range(col - ring, col + ring + 1)]
+        for r in range(row - ring + 1, row + ring):
+            keys.append((r, col - ring))
+            keys.append((r, col + ring))
+        return keys
+
+    def build(self, rows):
+        """Replace the index contents with (id, lat, lng, blood_group, expires_at, created_at) rows"""
+        with self._lock:
+            self.clear()
+            for row in rows:
+                self.add(*row)
+            self._built_at = time.monotonic()
+
+    def sync(self, now=None):
+        """
+        Rebuild from the database every refresh_seconds; in between, pick up
+        requests created by other workers (ids above the highest one seen)
+        and, with the shared change bus, drop the ones they closed.
+        """
+        from app.models import BloodRequest
+        from app.services.event_bus import change_bus
+        from app.services.request_query import open_requests_query
+
+        columns = (BloodRequest.id, BloodRequest.lat, BloodRequest.lng, BloodRequest.blood_group,
+                   BloodRequest.expires_at, BloodRequest.created_at)
+        stale = self._built_at is None or time.monotonic() - self._built_at > self.refresh_seconds
+        if not stale and change_bus.shared:
+            stale = not self._remove_closed()
+        if stale:
+            # Read the outbox position first: a close committed during the build is applied next sync
+            self._last_event_id = self._newest_event_id() if change_bus.shared else None
+            self.build(open_requests_query(now).with_entities(*columns).all())
+            return
+        new_rows = open_requests_query(now).with_entities(*columns).filter(BloodRequest.id > self._max_id).all()
+        with self._lock:
+            for row in new_rows:
+                self.add(*row)
+
+    @staticmethod
+    def _newest_event_id():
+        from app.models import ChangeEventLog, db
+        return db.session.query(db.func.max(ChangeEventLog.id)).scalar() or 0
+
+    def _remove_closed(self):
+        """
+        Remove requests closed or expired since the last sync, as recorded in
+        the change_events outbox. False if that can't be told (the outbox was
+        purged past the last event read), so the caller rebuilds instead.
+        """
+        from app.models import ChangeEventLog, db
+        from app.services.event_bus import REQUEST_CLOSED, REQUEST_EXPIRED
+
+        if self._last_event_id is None:
+            return False
+        oldest = db.session.query(db.func.min(ChangeEventLog.id)).scalar()
+        if oldest is not None and oldest > self._last_event_id + 1:
+            return False
+        newest = self._newest_event_id()
+        rows = db.session.query(ChangeEventLog.id, ChangeEventLog.request_id).filter(
+            ChangeEventLog.id > self._last_event_id - self.EVENT_OVERLAP,
+            ChangeEventLog.event_type.in_([REQUEST_CLOSED, REQUEST_EXPIRED])
+        ).all()
+        with self._lock:
+            for _, req_id in rows:
+                self.remove(req_id)
+            self._last_event_id = max(self._last_event_id, newest)
+        return True
+
+spatial_index = SpatialIndex()
@@ -120,6 +120,20 @@ function checkApiHealth() {
     });
 }
 
+// Filters of the request list, also sent to /stream so only relevant events arrive
+function requestFilterParams() {
+    const params = new URLSearchParams();
+    const bloodGroup = $("#filterBloodGroup").val();
+    if (bloodGroup) params.append("blood_group", bloodGroup);
+
+    if (userLat && userLng) {
+        params.append("lat", userLat);
+        params.append("lng", userLng);
+        params.append("radius_km", $("#radiusKm").val());
+    }
+    return params;
+}
+
 // Load requests from API
 function loadRequests() {
     $("#loadingSpinner").removeClass("d-none");
@@ -132,13 +146,11 @@ function loadRequests() {
     });
 
     // Add filters
-    const bloodGroup = $("#filterBloodGroup").val();
-    if (bloodGroup) params.append("blood_group", bloodGroup);
+    requestFilterParams().forEach((value, key) => params.append(key, value));
 
-    if (userLat && userLng) {
-        params.append("lat", userLat);
-        params.append("lng", userLng);
-        params.append("radius_km", $("#radiusKm").val());
+    // The change stream only sends events for these filters; resubscribe when they change
+    if (changeStream && requestFilterParams().toString() !== streamFilters) {
+        startAutoRefresh();
     }
 
     $.ajax({
@@ -229,10 +241,10 @@ function displayRequests(response) {
                             
                             <div class="row text-center mb-3">
                                 <div class="col-6">
-                                    <div class="text-muted small">Units Needed</div>
+                                    <div class="text-muted small">Units Pledged</div>
                                     <div class="fw-bold text-danger">${
-                                    request.units_needed
-                                    }</div>
+                                    request.units_pledged || 0
+                                    } / ${request.units_needed}</div>
                                 </div>
                                 <div class="col-6">
                                     <div class="text-muted small">Donors</div>
@@ -293,14 +305,49 @@ $("#requestsList").removeClass("d-none");
 }
 
 let refreshInterval = null;
+let changeStream = null;
+let streamFilters = null;
+let streamReloadTimer = null;
 
-// Refresh every 5 minutes
+// Live updates over server-sent events for the current filters. The
+// 5 minute poll stays as a safety net, and is all that runs without SSE
+// or when the server is at its stream limit
 function startAutoRefresh() {
-refreshInterval = setInterval(() => {
-    if ($("#requests-page").hasClass("active")) {
-        loadRequests();
+    stopAutoRefresh();
+    const poll = () => {
+        if ($("#requests-page").hasClass("active")) {
+            loadRequests();
+        }
+    };
+    refreshInterval = setInterval(poll, 5 * 60 * 1000); // 5 minutes
+    if (!window.EventSource) {
+        return;
+    }
+
+    streamFilters = requestFilterParams().toString();
+    changeStream = new EventSource(`${API_ENDPOINTS.REQUESTS}/stream?${streamFilters}`);
+    const reload = () => {
+        // Coalesce bursts of changes into one reload
+        clearTimeout(streamReloadTimer);
+        streamReloadTimer = setTimeout(poll, 1000);
+    };
+    ["request.created", "request.optin", "request.closed", "request.expired", "reset"].forEach((type) =>
+        changeStream.addEventListener(type, reload)
+    );
+    let connected = false;
+    changeStream.onopen = () => {
+        // Reconnected (possibly to another worker): catch up on anything missed
+        if (connected) {
+            reload();
         }
-    }, 5 * 60 * 1000); // 5 minutes
+        connected = true;
+    };
+    changeStream.onerror = () => {
+        // A 503 (server at its stream limit) closes the EventSource for good: keep polling
+        if (changeStream && changeStream.readyState === EventSource.CLOSED) {
+            changeStream = null;
+        }
+    };
 }
 
 function stopAutoRefresh() {
@@ -308,6 +355,11 @@ function stopAutoRefresh() {
         clearInterval(refreshInterval);
         refreshInterval = null;
     }
+    if (changeStream) {
+        changeStream.close();
+        changeStream = null;
+    }
+    clearTimeout(streamReloadTimer);
 }
 
 // Load request details
@@ -0,0 +1,51 @@
+"""
+Request-path cost of logging a prediction: synchronous add + commit per row
+vs handing the row to the background AuditLogWriter.
+
+    python benchmarks/bench_audit_log.py --rows 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import make_app
+
+def row(i):
+    return {'image_path': None, 'predicted_group': 'O+', 'confidence': 0.9, 'ip_address': f'10.0.0.{i % 250}'}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    from app.models import FingerprintLog, db
+    from app.services.audit_log import audit_log
+
+    # The audit writer is part of the model API
+    app = make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}", ENABLE_MODEL_API=True,
+                   MODEL_LOAD_ON_STARTUP=False, AUDIT_LOG_SPILL_DIR=tempfile.mkdtemp())
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(args.rows):
+            db.session.add(FingerprintLog(**row(i)))
+            db.session.commit()
+        sync_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        for i in range(args.rows):
+            audit_log.record(row(i))
+        enqueue_ms = (time.perf_counter() - started) * 1000
+        audit_log.flush()
+        total_ms = (time.perf_counter() - started) * 1000
+        count = FingerprintLog.query.count()
+
+    stats = audit_log.stats()
+    print(f"{args.rows} prediction log rows (SQLite)\n")
+    print(f"sync commit per row  {sync_ms:>8.0f} ms total, {sync_ms * 1000 / args.rows:>7.1f} us per request")
+    print(f"async record()       {enqueue_ms:>8.0f} ms total, {enqueue_ms * 1000 / args.rows:>7.1f} us per request")
+    print(f"async until flushed  {total_ms:>8.0f} ms ({stats['batches']} batches, {stats['spilled']} spilled)")
+    assert count == 2 * args.rows, count
+
+if __name__ == '__main__':
+    main()
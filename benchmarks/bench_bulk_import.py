@@ -0,0 +1,66 @@
+"""
+Loading a blood bank's backlog: one POST /api/requests per row vs a single
+streamed POST /api/requests/bulk, then a streaming export of the table.
+
+    python benchmarks/bench_bulk_import.py --rows 5000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from common import BLOOD_GROUPS, make_app, random_location
+
+def synthetic_records(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        lat, lng = random_location(rng)
+        yield {
+            'title': f'Imported request {i}',
+            'blood_group': rng.choice(BLOOD_GROUPS),
+            'contact_name': 'Blood bank',
+            'contact_phone': '0000000000',
+            'lat': lat,
+            'lng': lng,
+        }
+
+def fresh_app():
+    return make_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+    records = list(synthetic_records(args.rows))
+
+    client = fresh_app().test_client()
+    started = time.perf_counter()
+    for record in records:
+        client.post('/api/requests', json=record)
+    single_ms = (time.perf_counter() - started) * 1000
+
+    client = fresh_app().test_client()
+    body = ''.join(json.dumps(record) + '\n' for record in records).encode()
+    started = time.perf_counter()
+    summary = client.post('/api/requests/bulk', data=io.BytesIO(body), content_type='application/x-ndjson').get_json()
+    bulk_ms = (time.perf_counter() - started) * 1000
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get('/api/requests/export?format=csv')
+    exported = sum(chunk.count(b'\n') for chunk in response.response) - 1
+    export_ms = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{args.rows} requests (SQLite)\n")
+    print(f"per-row POST  {single_ms:>9.0f} ms")
+    print(f"bulk import   {bulk_ms:>9.0f} ms  ({summary['inserted']} inserted, {summary['failed']} failed)")
+    print(f"CSV export    {export_ms:>9.0f} ms  ({exported} rows, peak {peak / 1e6:.1f} MB traced)")
+
+if __name__ == '__main__':
+    main()
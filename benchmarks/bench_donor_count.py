@@ -0,0 +1,59 @@
+"""
+SQL statements issued per request-list call (guards against the donor_count N+1).
+
+Exits non-zero if the number of statements per call grows with the page size.
+
+    python benchmarks/bench_donor_count.py
+"""
+import argparse
+import sys
+
+from sqlalchemy import event
+
+from common import make_app, seed_donors, seed_requests, timeit
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = make_app(RESPONSE_CACHE_ENABLED=False)
+    seed_requests(app, args.rows)
+    seed_donors(app, per_request=3)
+    client = app.test_client()
+
+    from app.models import BloodRequest, db
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+        some_id = db.session.query(BloodRequest.id).first()[0]
+
+    print(f"{'call':<40} {'statements':>10} {'ms':>8}")
+    per_page_counts = set()
+    for per_page in (10, 50, 100):
+        counter.count = 0
+        response = client.get('/api/requests', query_string={'per_page': per_page})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        statements = counter.count
+        per_page_counts.add(statements)
+        best_ms, _ = timeit(lambda: client.get('/api/requests', query_string={'per_page': per_page}))
+        print(f"{f'GET /api/requests per_page={per_page}':<40} {statements:>10} {best_ms:>8.1f}")
+
+    counter.count = 0
+    client.get(f'/api/requests/{some_id}')
+    print(f"{f'GET /api/requests/{some_id}':<40} {counter.count:>10}")
+
+    if len(per_page_counts) != 1:
+        print("FAIL: statements per list call depend on page size (N+1 query)")
+        sys.exit(1)
+    print("OK: constant number of statements per list call")
+
+if __name__ == '__main__':
+    main()
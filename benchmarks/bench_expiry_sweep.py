@@ -0,0 +1,55 @@
+"""
+Closing expired requests: the old load-and-flip ORM loop vs the chunked
+set-based ExpirySweeper. Each run starts from a fresh database.
+
+    python benchmarks/bench_expiry_sweep.py --rows 100000 --expired-fraction 0.3
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from common import make_app, seed_requests
+
+def orm_cleanup():
+    """What POST /cleanup-expired used to do"""
+    from app.models import BloodRequest, db
+
+    expired = BloodRequest.query.filter(
+        BloodRequest.is_open == True,
+        BloodRequest.expires_at.isnot(None),
+        BloodRequest.expires_at <= datetime.utcnow()
+    ).all()
+    for req in expired:
+        req.is_open = False
+    db.session.commit()
+    return len(expired)
+
+def sweeper_cleanup():
+    from app.services.expiry_sweeper import expiry_sweeper
+    return len(expiry_sweeper.sweep())
+
+def run(label, fn, rows, expired_fraction):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(f'sqlite:///{db_path}')
+    seed_requests(app, rows, expired_fraction=expired_fraction, closed_fraction=0)
+    with app.app_context():
+        started = time.perf_counter()
+        closed = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+    print(f"{label:<10} {closed:>8} {elapsed:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--expired-fraction', type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"{args.rows} requests, {args.expired_fraction:.0%} expired (SQLite)\n")
+    print(f"{'method':<10} {'closed':>8} {'ms':>10}")
+    run('orm', orm_cleanup, args.rows, args.expired_fraction)
+    run('sweeper', sweeper_cleanup, args.rows, args.expired_fraction)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Microbenchmark: scalar math haversine in a Python loop vs the vectorised NumPy API.
+
+    python benchmarks/bench_haversine.py
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from common import CITIES, random_location
+
+from app.services.geo_service import distances_from, top_k, within_radius
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """The original math-based implementation"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * math.asin(math.sqrt(a)) * 6371
+
+def best_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--radius-km', type=float, default=15)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    lat, lng = CITIES[0]
+    print(f"{'points':>9} {'loop radius+sort ms':>20} {'numpy radius+sort ms':>21} "
+          f"{'loop top-k ms':>14} {'numpy top-k ms':>15}")
+    for size in args.sizes:
+        coords = [random_location(rng) for _ in range(size)]
+        lats = np.array([c[0] for c in coords])
+        lngs = np.array([c[1] for c in coords])
+
+        def loop_radius():
+            found = [(d, i) for i, (a, b) in enumerate(coords)
+                     if (d := scalar_haversine(lat, lng, a, b)) <= args.radius_km]
+            return sorted(found)
+
+        def numpy_radius():
+            distances = distances_from(lat, lng, lats, lngs)
+            mask = within_radius(distances, args.radius_km)
+            return top_k(distances, int(mask.sum()), mask)
+
+        def loop_top_k():
+            return sorted((scalar_haversine(lat, lng, a, b), i) for i, (a, b) in enumerate(coords))[:args.k]
+
+        def numpy_top_k():
+            return top_k(distances_from(lat, lng, lats, lngs), args.k)
+
+        assert [i for _, i in loop_top_k()] == numpy_top_k().tolist()
+        print(f"{size:>9} {best_ms(loop_radius, args.repeat):>20.2f} {best_ms(numpy_radius, args.repeat):>21.2f} "
+              f"{best_ms(loop_top_k, args.repeat):>14.2f} {best_ms(numpy_top_k, args.repeat):>15.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+GET /api/requests: original load-everything implementation vs the SQL query layer.
+
+    python benchmarks/bench_list_requests.py --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from common import make_app, seed_requests, timeit
+
+def legacy_list(blood_group='', lat=None, lng=None, radius_km=15, page=1, per_page=10):
+    """The list_requests body before the query layer: query.all() + Python filter/sort/slice"""
+    from app.models import BloodRequest
+    from app.services.geo_service import calculate_distance
+
+    query = BloodRequest.query.filter_by(is_open=True)
+    current_time = datetime.utcnow()
+    query = query.filter((BloodRequest.expires_at.is_(None)) | (BloodRequest.expires_at > current_time))
+    if blood_group:
+        query = query.filter_by(blood_group=blood_group)
+    requests_data = []
+    for req in query.all():
+        req_dict = req.to_dict()
+        if lat and lng and req.lat and req.lng:
+            distance = calculate_distance(lat, lng, req.lat, req.lng)
+            req_dict['distance_km'] = round(distance, 2)
+            if distance > radius_km:
+                continue
+        requests_data.append(req_dict)
+    if lat and lng:
+        requests_data.sort(key=lambda x: x.get('distance_km', float('inf')))
+    else:
+        requests_data.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    start = (page - 1) * per_page
+    return requests_data[start:start + per_page], len(requests_data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(f'sqlite:///{db_path}', RESPONSE_CACHE_ENABLED=False)
+    seed_requests(app, args.rows)
+    client = app.test_client()
+
+    cases = [
+        ('newest first, page 1', {}),
+        ('newest first, page 500', {'page': 500}),
+        ('blood_group=O+, page 1', {'blood_group': 'O+'}),
+        ('near Chennai 15 km, page 1', {'lat': 13.0827, 'lng': 80.2707, 'radius_km': 15}),
+        ('near Chennai 15 km, page 50', {'lat': 13.0827, 'lng': 80.2707, 'radius_km': 15, 'page': 50}),
+    ]
+
+    print(f"{args.rows} seeded requests (SQLite)\n")
+    print(f"{'case':<30} {'legacy ms':>10} {'legacy KiB':>11} {'new ms':>8} {'new KiB':>8} {'total':>7}")
+    for name, params in cases:
+        with app.test_request_context():
+            legacy_ms, _ = timeit(lambda: legacy_list(**params), args.repeat)
+            tracemalloc.start()
+            _, legacy_total = legacy_list(**params)
+            legacy_peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+        new_ms, _ = timeit(lambda: client.get('/api/requests', query_string=params), args.repeat)
+        tracemalloc.start()
+        body = client.get('/api/requests', query_string=params).get_json()
+        new_peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        print(f"{name:<30} {legacy_ms:>10.1f} {legacy_peak:>11.0f} {new_ms:>8.1f} {new_peak:>8.0f} "
+              f"{body['total']:>7}" + ('' if body['total'] == legacy_total else f" (legacy {legacy_total})"))
+
+    # Deep page through the keyset cursor instead of OFFSET
+    params = {'per_page': 50}
+    cursor = None
+    for _ in range(20):
+        body = client.get('/api/requests', query_string=dict(params, cursor=cursor) if cursor else params).get_json()
+        cursor = body['next_cursor']
+    offset_ms, _ = timeit(lambda: client.get('/api/requests', query_string={'per_page': 50, 'page': 2000}), args.repeat)
+    keyset_ms, _ = timeit(lambda: client.get('/api/requests', query_string={'per_page': 50, 'cursor': cursor}), args.repeat)
+    print(f"\ndeep page: OFFSET page 2000 {offset_ms:.1f} ms, keyset cursor {keyset_ms:.1f} ms")
+
+if __name__ == '__main__':
+    main()
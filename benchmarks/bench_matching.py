@@ -0,0 +1,58 @@
+"""
+"Requests this donor can fulfil near me": pull-everything-and-filter vs the
+matching engine (GET /api/requests?compatible_with=...).
+
+    python benchmarks/bench_matching.py --rows 100000
+"""
+import argparse
+import os
+import tempfile
+
+from common import CITIES, make_app, seed_requests, timeit
+
+def naive_matches(donor_group, lat, lng, radius_km, per_page=10):
+    """What a client had to do before: every open row, compatibility and ranking in Python"""
+    from app.services.geo_service import calculate_distance
+    from app.services.matching_service import band_of, can_donate
+    from app.services.request_query import NO_EXPIRY, open_requests_query
+
+    matches = []
+    for req in open_requests_query().all():
+        if not can_donate(donor_group, req.blood_group) or req.lat is None or req.lng is None:
+            continue
+        distance = calculate_distance(lat, lng, req.lat, req.lng)
+        if distance <= radius_km:
+            matches.append((band_of(distance), req.expires_at or NO_EXPIRY, distance, req.id))
+    matches.sort()
+    return matches[:per_page], len(matches)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(f'sqlite:///{db_path}', RESPONSE_CACHE_ENABLED=False)
+    # Every request open and unexpired, so all of them are candidates
+    seed_requests(app, args.rows, expired_fraction=0, closed_fraction=0)
+    client = app.test_client()
+    lat, lng = CITIES[0]
+
+    print(f"{args.rows} open requests (SQLite)\n")
+    print(f"{'donor':<6} {'radius':>6} {'naive ms':>9} {'engine ms':>10} {'memory ms':>10} {'matches':>8}")
+    for donor_group in ('O-', 'O+', 'AB+'):
+        for radius_km in (15, 50):
+            params = {'compatible_with': donor_group, 'lat': lat, 'lng': lng, 'radius_km': radius_km}
+            with app.app_context():
+                naive_ms, _ = timeit(lambda: naive_matches(donor_group, lat, lng, radius_km), args.repeat)
+                _, naive_total = naive_matches(donor_group, lat, lng, radius_km)
+            engine_ms, _ = timeit(lambda: client.get('/api/requests', query_string=params), args.repeat)
+            memory_ms, _ = timeit(lambda: client.get('/api/requests', query_string=dict(params, spatial_index='memory')),
+                                  args.repeat)
+            total = client.get('/api/requests', query_string=params).get_json()['total']
+            print(f"{donor_group:<6} {radius_km:>6} {naive_ms:>9.1f} {engine_ms:>10.1f} {memory_ms:>10.1f} "
+                  f"{total:>8}" + ('' if total == naive_total else f" (naive {naive_total})"))
+
+if __name__ == '__main__':
+    main()
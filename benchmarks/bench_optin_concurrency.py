@@ -0,0 +1,137 @@
+"""
+Hundreds of donors opting in to one emergency request at once, with client
+retries resubmitting some of them. Compares the old check-then-insert opt-in
+(what POST /optin used to do) with the current conditional-UPDATE path, and
+checks the result: no duplicate opt-ins, units_pledged equal to the stored
+rows, and exactly one request.closed event when the request is fulfilled.
+
+    python benchmarks/bench_optin_concurrency.py --optins 500 --concurrency 64
+    BENCH_DATABASE_URI='mssql+pyodbc://...' python benchmarks/bench_optin_concurrency.py
+
+SQLite serializes writers, so throughput there is mostly lock hand-off; the
+duplicate and counter checks hold on any backend.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+from collections import Counter
+
+from common import make_app, run_load
+
+def legacy_optin(req_id):
+    """What POST /api/requests/<id>/optin used to do"""
+    from flask import jsonify, request
+    from app.models import BloodRequest, DonorOptIn, db
+
+    data = request.get_json()
+    blood_request = BloodRequest.query.get_or_404(req_id)
+    if not blood_request.is_open:
+        return jsonify({'error': 'This request is no longer open'}), 400
+    donor_optin = DonorOptIn(request_id=req_id, donor_name=data['donor_name'], donor_contact=data['donor_contact'],
+                             donor_blood_group=data['donor_blood_group'])
+    db.session.add(donor_optin)
+    db.session.commit()
+    return jsonify({'donor_id': donor_optin.id}), 201
+
+def create_request(app, units_needed):
+    from app.models import BloodRequest, db
+
+    with app.app_context():
+        req = BloodRequest(title='Emergency appeal', blood_group='O-', units_needed=units_needed,
+                           contact_name='Bench', contact_phone='0000000000', lat=13.08, lng=80.27)
+        db.session.add(req)
+        db.session.commit()
+        return req.id
+
+def check(app, req_id):
+    from sqlalchemy import func
+    from app.models import BloodRequest, DonorOptIn, db
+
+    with app.app_context():
+        rows = DonorOptIn.query.filter_by(request_id=req_id).count()
+        contacts = db.session.query(func.count(func.distinct(DonorOptIn.donor_contact))).filter(
+            DonorOptIn.request_id == req_id).scalar()
+        req = db.session.get(BloodRequest, req_id)
+        return {'rows': rows, 'duplicates': rows - contacts, 'units_pledged': req.units_pledged,
+                'units_needed': req.units_needed, 'is_open': req.is_open}
+
+def run(label, app, path, args):
+    from app.services import event_bus
+    from app.services.event_bus import EventFilter, change_bus
+
+    req_id = create_request(app, args.units_needed)
+    # Unique donors plus resubmissions of some of them, shuffled together
+    rng = random.Random(args.seed)
+    donors = [f'9{i:09d}' for i in range(args.optins)]
+    submissions = donors + rng.sample(donors, int(len(donors) * args.retry_fraction))
+    rng.shuffle(submissions)
+
+    change_bus.max_pending = len(submissions) * 3
+    subscription = change_bus.subscribe(EventFilter())
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def call(client, i):
+        status = client.post(path.format(req_id), json={
+            'donor_name': f'Donor {submissions[i]}',
+            'donor_contact': submissions[i],
+            'donor_blood_group': 'O-',
+        }).status_code
+        with lock:
+            statuses[status] += 1
+        return status if status != 400 else 200  # "no longer open" is expected once fulfilled
+
+    result = run_load(app, call, args.concurrency, len(submissions))
+    closed_events = sum(e.type == event_bus.REQUEST_CLOSED for e in subscription.wait(0))
+    change_bus.unsubscribe(subscription)
+    state = check(app, req_id)
+
+    print(f"{label:<8} {result['requests']:>6} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+          f"{result['p99_ms']:>8} {state['rows']:>6} {state['duplicates']:>5} "
+          f"{state['units_pledged'] or 0:>4}/{state['units_needed']:<4} {str(not state['is_open']):>6} "
+          f"{closed_events:>6}   {dict(sorted(statuses.items()))}")
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--optins', type=int, default=500, help='Distinct donors')
+    parser.add_argument('--retry-fraction', type=float, default=0.2, help='Donors who submit twice')
+    parser.add_argument('--units-needed', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-uri', default=os.environ.get('BENCH_DATABASE_URI'))
+    args = parser.parse_args()
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app = make_app(uri, RESPONSE_CACHE_ENABLED=False, DB_POOL_SIZE=args.concurrency)
+    app.logger.disabled = True
+    app.add_url_rule('/bench/legacy-optin/<int:req_id>', 'legacy_optin', legacy_optin, methods=['POST'])
+    print(f"{args.optins} donors (+{args.retry_fraction:.0%} retries) on one request needing {args.units_needed} "
+          f"units, {args.concurrency} concurrent clients\n")
+    print(f"{'path':<8} {'reqs':>6} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'rows':>6} {'dups':>5} "
+          f"{'pledged':>9} {'closed':>6} {'events':>6}   statuses")
+
+    # The legacy path can't insert duplicate pairs once the unique constraint exists, so
+    # it runs against a table without it to show what the old write path produced
+    from app.models import DonorOptIn, db
+    with app.app_context():
+        constraint = next(c for c in DonorOptIn.__table__.constraints if c.name == 'uq_donor_optin_request_contact')
+        DonorOptIn.__table__.constraints.discard(constraint)
+        db.drop_all()
+        db.create_all()
+    run('legacy', app, '/bench/legacy-optin/{}', args)
+
+    with app.app_context():
+        DonorOptIn.__table__.append_constraint(constraint)
+        db.drop_all()
+        db.create_all()
+    state = run('atomic', app, '/api/requests/{}/optin', args)
+
+    expected = min(args.optins, args.units_needed)
+    ok = state['duplicates'] == 0 and state['rows'] == state['units_pledged'] == expected
+    print(f"\natomic path {'OK' if ok else 'FAILED'}: {state['rows']} opt-ins, expected {expected}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Per-image latency and allocations of the fingerprint preprocessing paths.
+
+Compares the original keras path (load_img -> img_to_array -> expand_dims ->
+preprocess_input) against app.services.preprocessing.decode_into.
+
+    python benchmarks/bench_preprocessing.py
+    python benchmarks/bench_preprocessing.py --image cluster_5_49.BMP --repeat 200
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.preprocessing import decode_into, TARGET_SIZE
+
+def legacy_preprocess(file_data):
+    """The path predict_fingerprint used before the preprocessing module"""
+    try:
+        from keras.preprocessing import image
+        from keras.applications.imagenet_utils import preprocess_input
+    except ImportError:
+        # Same operations without keras: nearest resize, float copies, caffe mode
+        img = Image.open(io.BytesIO(file_data)).convert('RGB').resize((256, 256), Image.NEAREST)
+        x = np.asarray(img, dtype=np.float32)
+        x = np.expand_dims(x, axis=0)
+        x = x[..., ::-1] - np.array([103.939, 116.779, 123.68], dtype=np.float32)
+        return x
+    img = image.load_img(io.BytesIO(file_data), target_size=(256, 256))
+    x = image.img_to_array(img)
+    x = np.expand_dims(x, axis=0)
+    return preprocess_input(x)
+
+def synthetic_image(size, fmt):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, fmt)
+    return buf.getvalue()
+
+def measure(fn, file_data, repeat):
+    fn(file_data)  # warm caches
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(file_data)
+    latency_ms = (time.perf_counter() - started) / repeat * 1000
+
+    tracemalloc.start()
+    fn(file_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latency_ms, peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', action='append', help='image file to include (repeatable)')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    cases = []
+    for path in args.image or []:
+        with open(path, 'rb') as f:
+            cases.append((os.path.basename(path), f.read()))
+    if not args.image:
+        sample = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cluster_5_49.BMP')
+        if os.path.exists(sample):
+            with open(sample, 'rb') as f:
+                cases.append(('cluster_5_49.BMP', f.read()))
+        cases.append(('synthetic 2048x2048 BMP', synthetic_image((2048, 2048), 'BMP')))
+        cases.append(('synthetic 2048x2048 TIFF', synthetic_image((2048, 2048), 'TIFF')))
+        cases.append(('synthetic 3000x3000 JPEG', synthetic_image((3000, 3000), 'JPEG')))
+
+    buffer = np.empty(TARGET_SIZE + (3,), dtype=np.float32)
+    paths = [
+        ('legacy', legacy_preprocess),
+        ('decode_into (exact)', lambda data: decode_into(data, buffer, fast_downscale=False)),
+        ('decode_into (fast)', lambda data: decode_into(data, buffer, fast_downscale=True)),
+    ]
+
+    print(f"{'image':<28} {'path':<22} {'ms/image':>10} {'peak KiB':>10} {'max |diff|':>11}")
+    for name, data in cases:
+        reference = legacy_preprocess(data)[0]
+        for label, fn in paths:
+            latency_ms, peak_kib = measure(fn, data, args.repeat)
+            diff = float(np.abs(np.asarray(fn(data)).reshape(reference.shape) - reference).max())
+            print(f"{name:<28} {label:<22} {latency_ms:>10.2f} {peak_kib:>10.0f} {diff:>11.3f}")
+
+if __name__ == '__main__':
+    main()
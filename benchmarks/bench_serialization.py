@@ -0,0 +1,47 @@
+"""
+Serializing a page of requests: ORM entities + to_dict + jsonify vs column
+tuples + serialization.dumps (orjson when installed), full and sparse.
+
+    python benchmarks/bench_serialization.py --rows 20000 --page-size 100
+"""
+import argparse
+import json
+
+from common import make_app, seed_requests, timeit
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from flask import jsonify
+    from app.models import BloodRequest
+    from app.services import serialization
+    from app.services.request_query import open_requests_query
+
+    app = make_app()
+    seed_requests(app, args.rows)
+
+    def legacy():
+        rows = open_requests_query().limit(args.page_size).all()
+        return jsonify({'requests': [row.to_dict() for row in rows]}).get_data()
+
+    def lean(fields):
+        rows = open_requests_query().with_entities(*serialization.request_columns(fields)).limit(args.page_size).all()
+        return serialization.json_response(
+            {'requests': [serialization.request_row(row, fields) for row in rows]}).get_data()
+
+    full = serialization.REQUEST_FIELDS
+    sparse = ('id', 'blood_group', 'lat', 'lng')
+    with app.test_request_context():
+        assert json.loads(legacy()) == json.loads(lean(full)), "lean output differs from to_dict"
+        print(f"{args.page_size} rows per page, encoder: {'orjson' if serialization.orjson else 'stdlib json'}\n")
+        for label, fn in (('to_dict + jsonify', legacy), ('columns + dumps', lambda: lean(full)),
+                          ('sparse fields', lambda: lean(sparse))):
+            best, mean = timeit(fn, args.repeat)
+            print(f"{label:<20} best {best:>7.2f} ms  mean {mean:>7.2f} ms  {len(fn()):>7} bytes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Radius and k-nearest lookups: geo_service linear scan vs the in-memory SpatialIndex.
+
+    python benchmarks/bench_spatial_index.py
+    python benchmarks/bench_spatial_index.py --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from common import CITIES, random_location
+
+from app.services.geo_service import filter_by_distance, get_nearest_requests
+from app.services.spatial_index import SpatialIndex
+
+def best_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--radius-km', type=float, default=15)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    lat, lng = CITIES[0]
+
+    print(f"{'points':>9} {'build ms':>9} {'scan radius ms':>15} {'index radius ms':>16} "
+          f"{'scan knn ms':>12} {'index knn ms':>13} {'matches':>8}")
+    for size in args.sizes:
+        points = [SimpleNamespace(id=i, lat=p[0], lng=p[1])
+                  for i, p in enumerate((random_location(rng) for _ in range(size)), start=1)]
+
+        index = SpatialIndex()
+        started = time.perf_counter()
+        index.build((p.id, p.lat, p.lng, 'O+', None, None) for p in points)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        scan_radius = best_ms(lambda: filter_by_distance(lat, lng, points, args.radius_km), args.repeat)
+        index_radius = best_ms(lambda: index.radius(lat, lng, args.radius_km), args.repeat)
+        # No radius cap for k-nearest: the scan has to look at everything
+        scan_knn = best_ms(lambda: get_nearest_requests(lat, lng, points, float('inf'), args.k), args.repeat)
+        index_knn = best_ms(lambda: index.nearest(lat, lng, args.k), args.repeat)
+
+        expected = [p.id for p in filter_by_distance(lat, lng, points, args.radius_km)]
+        found = [req_id for _, req_id in index.radius(lat, lng, args.radius_km)]
+        assert sorted(expected) == sorted(found), "index and scan disagree"
+
+        print(f"{size:>9} {build_ms:>9.0f} {scan_radius:>15.1f} {index_radius:>16.2f} "
+              f"{scan_knn:>12.1f} {index_knn:>13.2f} {len(found):>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Worker startup cost: time-to-first-request and RSS for the requests API and
+the model API, each measured in a fresh interpreter (like a gunicorn worker).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --model-path models/model_blood_group_detection_resnet.h5 --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process; started is taken before any app import
+CHILD = r'''
+import time
+started = time.perf_counter()
+import json, os, resource, sys
+sys.path.insert(0, {root!r})
+from config import Config
+from app import create_app
+from app.models import db
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    ENABLE_MODEL_API = {model_api!r}
+
+app = create_app(BenchConfig)
+with app.app_context():
+    db.create_all()
+app_ready = time.perf_counter()
+
+if {model_api!r}:
+    from app.services.model_service import model_registry
+    model_registry.load_on_startup(app)
+    response = app.test_client().get("/api/model/health")
+else:
+    response = app.test_client().get("/api/requests")
+first_response = time.perf_counter()
+
+print(json.dumps({{
+    "create_app_s": round(app_ready - started, 3),
+    "time_to_first_request_s": round(first_response - started, 3),
+    "status": response.status_code,
+    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "tensorflow_imported": "tensorflow" in sys.modules,
+}}))
+'''
+
+def run_scenario(model_api, model_path):
+    env = dict(os.environ)
+    env["DATABASE_URI"] = "sqlite://"
+    if model_path:
+        env["MODEL_PATH"] = os.path.abspath(model_path)
+    code = CHILD.format(root=ROOT, model_api=model_api)
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", help="model file to load for the model API scenario")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    scenarios = [("requests API (ENABLE_MODEL_API=0)", False), ("model API", True)]
+    print(f"{'scenario':<36} {'create_app s':>12} {'first req s':>12} {'max RSS MB':>11} {'TF':>4} {'status':>7}")
+    for name, model_api in scenarios:
+        runs = [run_scenario(model_api, args.model_path) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["time_to_first_request_s"])
+        print(f"{name:<36} {best['create_app_s']:>12} {best['time_to_first_request_s']:>12} "
+              f"{max(r['max_rss_mb'] for r in runs):>11} {'yes' if best['tensorflow_imported'] else 'no':>4} "
+              f"{best['status']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Shared helpers for the benchmark scripts: an offline SQLite app and synthetic data."""
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import Config
+
+BLOOD_GROUPS = ['A+', 'A-', 'AB+', 'AB-', 'B+', 'B-', 'O+', 'O-']
+# Rough population-weighted blood group frequencies
+BLOOD_GROUP_WEIGHTS = [30, 6, 4, 1, 9, 2, 39, 9]
+# City centres (lat, lng) requests cluster around
+CITIES = [(13.0827, 80.2707), (12.9716, 77.5946), (19.0760, 72.8777), (28.7041, 77.1025), (22.5726, 88.3639)]
+
+def make_app(database_uri="sqlite://", **overrides):
+    """Create the app against SQLite with the model API off unless asked for"""
+    from app import create_app
+    from app.models import db
+
+    settings = {'SQLALCHEMY_DATABASE_URI': database_uri, 'ENABLE_MODEL_API': False, 'TESTING': True}
+    settings.update(overrides)
+    BenchConfig = type('BenchConfig', (Config,), settings)
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def random_location(rng):
+    lat, lng = rng.choice(CITIES)
+    # Most requests within ~30 km of a city centre
+    return lat + rng.gauss(0, 0.15), lng + rng.gauss(0, 0.15)
+
+def seed_requests(app, count, seed=42, expired_fraction=0.1, closed_fraction=0.1, chunk_size=10000):
+    """Bulk insert `count` synthetic blood requests"""
+    from app.models import BloodRequest, db
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with app.app_context():
+        rows = []
+        for i in range(count):
+            lat, lng = random_location(rng)
+            expires_at = None
+            if rng.random() < expired_fraction:
+                expires_at = now - timedelta(hours=rng.randint(1, 500))
+            elif rng.random() < 0.5:
+                expires_at = now + timedelta(hours=rng.randint(1, 500))
+            rows.append({
+                'title': f'Synthetic request {i}',
+                'blood_group': rng.choices(BLOOD_GROUPS, BLOOD_GROUP_WEIGHTS)[0],
+                'units_needed': rng.randint(1, 4),
+                'contact_name': 'Bench',
+                'contact_phone': '0000000000',
+                'address': 'Synthetic',
+                'lat': lat,
+                'lng': lng,
+                'created_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                'expires_at': expires_at,
+                'is_open': rng.random() >= closed_fraction,
+                'description': '',
+            })
+            if len(rows) >= chunk_size:
+                db.session.bulk_insert_mappings(BloodRequest, rows)
+                rows = []
+        if rows:
+            db.session.bulk_insert_mappings(BloodRequest, rows)
+        db.session.commit()
+
+def seed_donors(app, per_request=2, seed=42, chunk_size=10000):
+    """Attach roughly `per_request` donor opt-ins to every request"""
+    from app.models import BloodRequest, DonorOptIn, db
+
+    rng = random.Random(seed)
+    with app.app_context():
+        ids = [row[0] for row in db.session.query(BloodRequest.id).all()]
+        rows = []
+        for request_id in ids:
+            for j in range(rng.randint(0, per_request * 2)):
+                rows.append({
+                    'request_id': request_id,
+                    'donor_name': f'Donor {request_id}-{j}',
+                    'donor_contact': f'{request_id:07d}{j:03d}',
+                    'donor_blood_group': rng.choices(BLOOD_GROUPS, BLOOD_GROUP_WEIGHTS)[0],
+                    'prediction_confidence': rng.uniform(0.65, 1.0),
+                })
+                if len(rows) >= chunk_size:
+                    db.session.bulk_insert_mappings(DonorOptIn, rows)
+                    rows = []
+        if rows:
+            db.session.bulk_insert_mappings(DonorOptIn, rows)
+        db.session.commit()
+
+def timeit(fn, repeat=5):
+    """Best-of and mean wall time in milliseconds"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return min(samples), sum(samples) / len(samples)
+
+def make_tiny_model(path, seed=42):
+    """
+    Save a small stand-in for the ResNet: same input shape and 8 softmax
+    outputs, so the model path (load, warm-up, batching, predict) runs
+    without the real .h5. Needs keras/tensorflow installed.
+    """
+    import keras
+    from keras import layers
+
+    from app.services.model_service import INPUT_SHAPE, LABELS
+
+    keras.utils.set_random_seed(seed)
+    model = keras.Sequential([
+        layers.Input(shape=INPUT_SHAPE),
+        layers.AveragePooling2D(pool_size=8),
+        layers.Conv2D(8, 3, activation='relu'),
+        layers.GlobalAveragePooling2D(),
+        layers.Dense(len(LABELS), activation='softmax'),
+    ])
+    model.save(path)
+    return path
+
+def fingerprint_images(count, seed=42, size=(300, 300)):
+    """Distinct grayscale PNGs with ridge-like stripes, as uploaded bytes"""
+    import io
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:size[1], 0:size[0]]
+    images = []
+    for _ in range(count):
+        angle, freq = rng.uniform(0, np.pi), rng.uniform(0.1, 0.3)
+        ridges = np.sin((xx * np.cos(angle) + yy * np.sin(angle)) * freq)
+        pixels = ((ridges + rng.normal(0, 0.3, ridges.shape)) * 60 + 128).clip(0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'L').save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+def rss_mb():
+    """Current resident set size (Linux), else None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return None
+
+def peak_rss_mb():
+    """High-water RSS of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(p * len(sorted_samples)))]
+
+def run_load(app, call, concurrency, total):
+    """
+    Run `total` calls of call(client, i) -> status code spread over
+    `concurrency` threads, each with its own test client. Returns a summary
+    with throughput, latency percentiles (ms) and the error count.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(total))
+    gate = threading.Barrier(concurrency + 1)
+
+    def worker():
+        client = app.test_client()
+        gate.wait()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = call(client, i)
+            except Exception:
+                status = 599
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'errors': len(errors),
+    }
@@ -0,0 +1,93 @@
+"""
+Connection pool under concurrent load: N client threads hammer
+GET /api/requests (response cache off, so every call checks out a
+connection) and we report latency, throughput and pool metrics.
+
+    python benchmarks/load_db_pool.py --clients 50 100 250 500
+    BENCH_DATABASE_URI='mssql+pyodbc://...' python benchmarks/load_db_pool.py --no-seed --pool-size 10 --max-overflow 10
+
+Against SQLite this mostly shows pool queueing (SQLite serializes writers,
+not readers); point --database-uri / BENCH_DATABASE_URI at SQL Server for real numbers.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import CITIES, make_app, seed_requests
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+def run_level(app, clients, requests_per_client):
+    from app.database import pool_metrics
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(clients + 1)
+
+    def client_loop(n):
+        client = app.test_client()
+        lat, lng = CITIES[n % len(CITIES)]
+        params = {'lat': lat, 'lng': lng, 'radius_km': 15, 'per_page': 20}
+        start_gate.wait()
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            status = client.get('/api/requests', query_string=params).status_code
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client_loop, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    pool_metrics.reset()
+    start_gate.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    pool = pool_metrics.stats()
+    waits = pool['checkout_wait_ms']
+    print(f"{clients:>7} {len(latencies) / wall:>8.0f} {percentile(latencies, 0.5):>8.1f} "
+          f"{percentile(latencies, 0.95):>8.1f} {percentile(latencies, 0.99):>8.1f} "
+          f"{waits['p95'] or 0:>10.2f} {waits['max'] or 0:>10.1f} {pool['max_overflow_seen']:>8} "
+          f"{pool['timeouts']:>8} {len(errors):>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 100, 250, 500])
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--database-uri', default=os.environ.get('BENCH_DATABASE_URI'))
+    parser.add_argument('--no-seed', action='store_true', help='Use the existing data in --database-uri')
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--max-overflow', type=int, default=10)
+    parser.add_argument('--pool-timeout', type=int, default=30)
+    args = parser.parse_args()
+
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app = make_app(database_uri, RESPONSE_CACHE_ENABLED=False, DB_POOL_SIZE=args.pool_size,
+                   DB_MAX_OVERFLOW=args.max_overflow, DB_POOL_TIMEOUT=args.pool_timeout)
+    app.logger.disabled = True
+    if not args.no_seed:
+        seed_requests(app, args.rows)
+
+    with app.app_context():
+        from app.models import db
+        dialect = db.engine.dialect.name
+    print(f"{dialect}, pool_size={args.pool_size} max_overflow={args.max_overflow} "
+          f"timeout={args.pool_timeout}s, {args.requests} requests per client\n")
+    print(f"{'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'wait p95':>10} {'wait max':>10} {'overflow':>8} {'timeouts':>8} {'errors':>6}")
+    for clients in args.clients:
+        run_level(app, clients, args.requests)
+
+if __name__ == '__main__':
+    main()
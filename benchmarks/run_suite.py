@@ -0,0 +1,188 @@
+"""
+Reproducible end-to-end benchmark: seeds an offline SQLite database, drives
+each API endpoint with concurrent clients and writes throughput, latency
+percentiles and RSS per scenario to JSON. Diff two runs with --compare.
+
+    python benchmarks/run_suite.py --rows 100000 --out bench-results.json
+    python benchmarks/run_suite.py --rows 100000 --out new.json --compare bench-results.json
+    python benchmarks/run_suite.py --rows 1000 --scenarios list_nearby donor_optin --skip-model
+
+The model scenario uses a tiny stand-in Keras model (see common.make_tiny_model),
+so it needs keras/tensorflow but not the real .h5. Response and prediction
+caches are off unless --caches is given, so every call does the full work.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import (BLOOD_GROUPS, ROOT, fingerprint_images, make_app, make_tiny_model, peak_rss_mb,
+                    random_location, rss_mb, run_load, seed_donors, seed_requests)
+
+def open_request_ids(app):
+    from app.models import BloodRequest
+    from app.services.request_query import open_requests_query
+
+    with app.app_context():
+        return [row[0] for row in open_requests_query().with_entities(BloodRequest.id).all()]
+
+def build_scenarios(app, seed, images):
+    """name -> call(client, i); every scenario draws from its own seeded RNG"""
+    ids = open_request_ids(app)
+    rng = {}
+
+    def rand(name):
+        return rng.setdefault(name, random.Random(f"{seed}-{name}"))
+
+    def list_requests(client, i):
+        return client.get('/api/requests', query_string={'page': rand('list').randint(1, 5), 'per_page': 20}).status_code
+
+    def list_nearby(client, i):
+        lat, lng = random_location(rand('nearby'))
+        return client.get('/api/requests', query_string={'lat': lat, 'lng': lng, 'radius_km': 15}).status_code
+
+    def list_compatible(client, i):
+        r = rand('compatible')
+        lat, lng = random_location(r)
+        params = {'compatible_with': r.choice(BLOOD_GROUPS), 'lat': lat, 'lng': lng, 'radius_km': 25}
+        return client.get('/api/requests', query_string=params).status_code
+
+    def get_request(client, i):
+        return client.get(f"/api/requests/{rand('get').choice(ids)}").status_code
+
+    def request_donors(client, i):
+        return client.get(f"/api/requests/{rand('donors').choice(ids)}/donors").status_code
+
+    def donor_optin(client, i):
+        r = rand('optin')
+        return client.post(f"/api/requests/{r.choice(ids)}/optin", json={
+            'donor_name': f'Bench donor {i}',
+            'donor_contact': f'9{i:09d}',
+            'donor_blood_group': r.choice(BLOOD_GROUPS),
+            'confidence': 0.9,
+        }).status_code
+
+    def predict(client, i):
+        import io
+        data = {'fingerprint': (io.BytesIO(images[i % len(images)]), f'print-{i}.png')}
+        return client.post('/api/model/predict', data=data, content_type='multipart/form-data').status_code
+
+    scenarios = {
+        'list_requests': list_requests,
+        'list_nearby': list_nearby,
+        'list_compatible': list_compatible,
+        'get_request': get_request,
+        'request_donors': request_donors,
+        'donor_optin': donor_optin,
+    }
+    if images:
+        scenarios['predict'] = predict
+    return scenarios
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':<16} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for result in results:
+        old = baseline.get(result['scenario'])
+        if not old:
+            continue
+        def change(key):
+            if not old.get(key) or result.get(key) is None:
+                return '-'
+            return f"{(result[key] - old[key]) / old[key] * 100:+.0f}%"
+        print(f"{result['scenario']:<16} {change('throughput_rps'):>8} {change('p50_ms'):>8} "
+              f"{change('p95_ms'):>8} {change('p99_ms'):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='Synthetic blood requests (1k - 1M)')
+    parser.add_argument('--donors-per-request', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='Calls per scenario')
+    parser.add_argument('--predict-requests', type=int, default=200)
+    parser.add_argument('--scenarios', nargs='+', default=None)
+    parser.add_argument('--skip-model', action='store_true', help='Skip /api/model/predict (no keras needed)')
+    parser.add_argument('--caches', action='store_true', help='Leave response and prediction caches on')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench-results.json')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to diff against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bloodclan-bench-')
+    settings = {
+        'RESPONSE_CACHE_ENABLED': args.caches,
+        'PREDICTION_CACHE_ENABLED': args.caches,
+        'AUDIT_LOG_SPILL_DIR': os.path.join(workdir, 'audit_spill'),
+    }
+    images = []
+    if not args.skip_model:
+        settings.update({
+            'ENABLE_MODEL_API': True,
+            'MODEL_PATH': make_tiny_model(os.path.join(workdir, 'tiny_model.h5'), args.seed),
+            'MODEL_LOAD_ON_STARTUP': True,
+        })
+        images = fingerprint_images(64, args.seed)
+
+    started = time.perf_counter()
+    app = make_app(f"sqlite:///{os.path.join(workdir, 'bench.db')}", **settings)
+    app.logger.disabled = True
+    seed_requests(app, args.rows, seed=args.seed)
+    seed_donors(app, args.donors_per_request, seed=args.seed)
+    if not args.skip_model:
+        from app.services.model_service import model_registry
+        model_registry.load_on_startup(app)
+    print(f"Seeded {args.rows} requests in {time.perf_counter() - started:.1f}s ({workdir})\n")
+
+    scenarios = build_scenarios(app, args.seed, images)
+    names = args.scenarios or list(scenarios)
+    unknown = set(names) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown or unavailable scenarios: {', '.join(sorted(unknown))}")
+
+    results = []
+    print(f"{'scenario':<16} {'reqs':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'rss MB':>7} {'peak MB':>8}")
+    for name in names:
+        total = args.predict_requests if name == 'predict' else args.requests
+        result = {'scenario': name, **run_load(app, scenarios[name], args.concurrency, total),
+                  'rss_mb': round(rss_mb() or 0, 1), 'peak_rss_mb': round(peak_rss_mb(), 1)}
+        results.append(result)
+        print(f"{name:<16} {result['requests']:>6} {result['throughput_rps']:>8} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['p99_ms']:>8} {result['errors']:>6} {result['rss_mb']:>7} "
+              f"{result['peak_rss_mb']:>8}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
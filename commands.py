@@ -1,3 +1,5 @@
+import os
+import time
 import click
 from flask.cli import with_appcontext
 from app.models import db
@@ -19,6 +21,177 @@ def init_db():
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
 
+@click.command("upgrade-db")
+@with_appcontext
+def upgrade_db():
+    """Add columns, indexes and constraints missing from tables created by an older init-db, with backfills."""
+    from app.services import schema_upgrade
+    
+    try:
+        schema_upgrade.upgrade()
+        print("✅ Database schema is up to date")
+    except Exception as e:
+        print(f"❌ Error upgrading database: {e}")
+        raise SystemExit(1)
+
+@click.command("sweep-expired")
+@click.option("--loop", is_flag=True, help="Keep sweeping every EXPIRY_SWEEP_INTERVAL_SECONDS.")
+@click.option("--chunk-size", type=int, default=None, help="Rows closed per UPDATE (default from config).")
+@with_appcontext
+def sweep_expired(loop, chunk_size):
+    """Close expired blood requests and purge expired prediction cache rows (cron / sidecar alternative to the in-app thread)."""
+    from app.services.expiry_sweeper import expiry_sweeper
+    if chunk_size:
+        expiry_sweeper.chunk_size = chunk_size
+    
+    while True:
+        try:
+            if not loop or expiry_sweeper.acquire_lease():
+                closed = expiry_sweeper.sweep()
+                print(f"Closed {len(closed)} expired requests in {expiry_sweeper.last_duration_ms} ms")
+                purged = expiry_sweeper.purge_caches()
+                if purged:
+                    print(f"Purged {purged} expired prediction cache rows")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error sweeping expired requests: {e}")
+        if not loop:
+            break
+        time.sleep(expiry_sweeper.interval_seconds)
+
+@click.command("import-records")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--kind", type=click.Choice(["requests", "donors"]), default="requests")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None,
+              help="Defaults to the file extension.")
+@click.option("--chunk-size", type=int, default=None, help="Rows per executemany (default from config).")
+@with_appcontext
+def import_records(path, kind, fmt, chunk_size):
+    """Bulk import blood requests or donor opt-ins from a CSV / NDJSON file."""
+    from flask import current_app
+    from app.services import bulk_io
+    
+    try:
+        with open(path, "rb") as f:
+            summary = bulk_io.import_records(
+                bulk_io.iter_records(f, bulk_io.detect_format(fmt, filename=path)),
+                kind=kind,
+                chunk_size=chunk_size or current_app.config.get("BULK_IMPORT_CHUNK_SIZE", 1000),
+                max_errors=current_app.config.get("BULK_IMPORT_MAX_ERRORS", 100)
+            )
+        print(f"✅ Inserted {summary['inserted']} {kind}, {summary['failed']} rows failed")
+        for error in summary["errors"]:
+            print(f"  line {error['line']}: {error['error']}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error importing {path}: {e}")
+
+@click.command("export-records")
+@click.argument("path", type=click.Path(dir_okay=False))
+@click.option("--kind", type=click.Choice(["requests", "donors"]), default="requests")
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson", "json"]), default=None,
+              help="Defaults to the file extension.")
+@click.option("--open-only", is_flag=True, help="Only open requests.")
+@with_appcontext
+def export_records(path, kind, fmt, open_only):
+    """Stream blood requests or donor opt-ins to a CSV / NDJSON file."""
+    from flask import current_app
+    from app.services import bulk_io
+    
+    with open(path, "wb") as f:
+        for chunk in bulk_io.iter_export(kind, bulk_io.detect_format(fmt, path, formats=bulk_io.EXPORT_FORMATS), open_only,
+                                         current_app.config.get("BULK_EXPORT_CHUNK_SIZE", 1000)):
+            f.write(chunk)
+    print(f"✅ Exported {kind} to {path}")
+
+@click.command("convert-model")
+@click.option("--format", "fmt", type=click.Choice(["tflite", "onnx"]), default="tflite")
+@click.option("--quantize", type=click.Choice(["none", "float16", "int8"]), default="float16",
+              help="TFLite post-training quantization.")
+@click.option("--calibration-dir", type=click.Path(exists=True, file_okay=False), default=None,
+              help="Fingerprint images used to calibrate int8 quantization.")
+@click.option("--calibration-size", type=int, default=200, help="Max calibration images.")
+@click.option("--source", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Keras .h5 to convert (default MODEL_PATH).")
+@click.option("--out", type=click.Path(dir_okay=False), default=None,
+              help="Output file (default next to the .h5, where INFERENCE_BACKEND looks for it).")
+@with_appcontext
+def convert_model(fmt, quantize, calibration_dir, calibration_size, source, out):
+    """Export the Keras blood group model to TFLite (float16 / int8) or ONNX."""
+    from flask import current_app
+    from app.services import model_conversion
+    from app.services.model_service import artifact_path
+    
+    source = source or current_app.config["MODEL_PATH"]
+    out = out or artifact_path(source, fmt)
+    try:
+        if fmt == "onnx":
+            model_conversion.convert_to_onnx(source, out)
+        else:
+            calibration = None
+            if calibration_dir:
+                paths = model_conversion.find_images(
+                    calibration_dir, current_app.config.get("ALLOWED_IMAGE_EXTENSIONS"), calibration_size)
+                calibration, paths = model_conversion.load_inputs(paths)
+                print(f"Calibrating with {len(paths)} images")
+            model_conversion.convert_to_tflite(source, out, quantize, calibration)
+        print(f"✅ Wrote {out} ({os.path.getsize(out) / 1e6:.1f} MB, source {os.path.getsize(source) / 1e6:.1f} MB)")
+    except Exception as e:
+        print(f"❌ Error converting {source}: {e}")
+
+@click.command("model-report")
+@click.argument("images_dir", type=click.Path(exists=True, file_okay=False))
+@click.option("--backend", type=click.Choice(["keras", "tflite", "onnx"]), default="tflite")
+@click.option("--model", "model_path", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="Candidate model file (default next to MODEL_PATH).")
+@click.option("--limit", type=int, default=None, help="Max images compared.")
+@click.option("--batch-size", type=int, default=16)
+@click.option("--min-agreement", type=float, default=None,
+              help="Exit with status 1 below this group agreement or on any threshold flip.")
+@click.option("--out", type=click.Path(dir_okay=False), default=None, help="Also write the report as JSON.")
+@with_appcontext
+def model_report(images_dir, backend, model_path, limit, batch_size, min_agreement, out):
+    """Compare a converted model against the Keras baseline: groups, confidences, latency."""
+    import json
+    from flask import current_app
+    from app.services import model_conversion
+    from app.services.model_service import artifact_path
+    
+    config = current_app.config
+    baseline_path = config["MODEL_PATH"]
+    model_path = model_path or artifact_path(baseline_path, backend)
+    paths = model_conversion.find_images(images_dir, config.get("ALLOWED_IMAGE_EXTENSIONS"), limit)
+    inputs, paths = model_conversion.load_inputs(paths)
+    if not paths:
+        raise click.ClickException(f"No readable images in {images_dir}")
+    
+    report = model_conversion.accuracy_report(
+        baseline_path, backend, model_path, inputs, names=[os.path.relpath(p, images_dir) for p in paths],
+        threshold=config.get("PREDICT_THRESHOLD", 0.65), batch_size=batch_size)
+    base, cand = report["baseline"], report["candidate"]
+    print(f"{report['images']} images, keras vs {backend}")
+    print(f"  group agreement  {report['group_agreement'] * 100:.2f}% ({report['group_mismatches']} mismatches)")
+    print(f"  threshold flips  {report['threshold_flips']} (allowed_to_donate changes at {report['threshold']})")
+    print(f"  confidence delta mean {report['confidence_delta']['mean']}, max {report['confidence_delta']['max']}")
+    print(f"  latency p50      {base['p50_ms']} ms -> {cand['p50_ms']} ms per image")
+    print(f"  latency p95      {base['p95_ms']} ms -> {cand['p95_ms']} ms per image")
+    print(f"  model size       {base['bytes'] / 1e6:.1f} MB -> {cand['bytes'] / 1e6:.1f} MB")
+    for example in report["mismatches"]:
+        print(f"  {example['image']}: {example['baseline']['group']} {example['baseline']['confidence']} -> "
+              f"{example['candidate']['group']} {example['candidate']['confidence']}")
+    if out:
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+    
+    if min_agreement is not None and (report["group_agreement"] < min_agreement or report["threshold_flips"]):
+        raise SystemExit(1)
+
 # Add to your app
 def register_commands(app):
-    app.cli.add_command(init_db)
\ No newline at end of file
+    app.cli.add_command(init_db)
+    app.cli.add_command(upgrade_db)
+    app.cli.add_command(sweep_expired)
+    app.cli.add_command(import_records)
+    app.cli.add_command(export_records)
+    app.cli.add_command(convert_model)
+    app.cli.add_command(model_report)
@@ -5,28 +5,137 @@ load_dotenv()
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-key-change-in-production")
-    SQLALCHEMY_DATABASE_URI = #add your database URI here os.environ.get("DATABASE_URL", "sqlite:///app.db")
+    # Add your database URI in .env (DATABASE_URI), falls back to a local SQLite file
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URI", "sqlite:///app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Connection pool, per gunicorn worker (see app/database.py); keep
+    # workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server's limit
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = True
+    DB_FAST_EXECUTEMANY = True  # mssql+pyodbc only
 
     # Model configuration
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'model_blood_group_detection_resnet.h5')
+    MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(os.path.dirname(__file__), 'models', 'model_blood_group_detection_resnet.h5'))
+    ENABLE_MODEL_API = os.environ.get("ENABLE_MODEL_API", "1") == "1"  # Register /api/model routes
+    MODEL_LOAD_ON_STARTUP = True  # Load + warm the model when a gunicorn worker starts
+    MODEL_RELOAD_CHECK_SECONDS = 30  # How often to look for a new .h5 file (0 disables)
+
+    # Micro-batching of concurrent predictions (needs concurrent requests per worker: gevent or gthread)
+    PREDICT_BATCHING_ENABLED = os.environ.get("PREDICT_BATCHING_ENABLED", "1") == "1"
+    PREDICT_BATCH_MAX_SIZE = int(os.environ.get("PREDICT_BATCH_MAX_SIZE", 16))
+    PREDICT_BATCH_WAIT_MS = float(os.environ.get("PREDICT_BATCH_WAIT_MS", 10))
+    # Bulk prediction endpoint (/api/model/predict/batch)
+    PREDICT_BULK_BATCH_SIZE = 32
+    PREDICT_BULK_MAX_FILES = 1000
+    PREDICT_DECODE_WORKERS = 4  # Shared image decode thread pool size
+    PREPROCESS_FAST_DOWNSCALE = True  # PIL draft mode for large JPEG scans
+    # Prediction cache keyed by image hash + model version
+    PREDICTION_CACHE_ENABLED = True
+    PREDICTION_CACHE_MAX_SIZE = 2048
+    PREDICTION_CACHE_TTL_SECONDS = 24 * 3600
+    PREDICTION_CACHE_SHARED = True  # Also use the prediction_cache table (shared by all workers)
+    # Admission control for /api/model/predict(/batch): keeps workers free for listing and health checks
+    ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+    # Predictions running at once, per worker (per host with ADMISSION_SHARED). Unset: PREDICT_BATCH_MAX_SIZE,
+    # so the InferenceBatcher can still fill a batch; gunicorn.conf.py lowers it under gthread
+    ADMISSION_MAX_CONCURRENT = int(os.environ["ADMISSION_MAX_CONCURRENT"]) if os.environ.get("ADMISSION_MAX_CONCURRENT") else None
+    ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", 8))  # Requests allowed to wait for a slot
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = 5.0  # Longest wait before a 503
+    ADMISSION_RATE_PER_SECOND = float(os.environ.get("ADMISSION_RATE_PER_SECOND", 2))  # Per client IP and worker (0 disables)
+    ADMISSION_BURST = int(os.environ.get("ADMISSION_BURST", 10))
+    ADMISSION_MAX_CLIENTS = 10000  # Token buckets kept per worker (least recently seen dropped)
+    ADMISSION_RETRY_AFTER_SECONDS = 5  # Retry-After on 503
+    ADMISSION_SHARED = False  # True: slots are lock files shared by all workers on the host
+    ADMISSION_LOCK_DIR = os.environ.get("ADMISSION_LOCK_DIR")  # Default: <tmp>/bloodclan-admission
+    # Inference runtime: 'keras' (full float32 .h5), 'tflite' or 'onnx' (files from `flask convert-model`)
+    INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")
+    INFERENCE_MODEL_PATH = os.environ.get("INFERENCE_MODEL_PATH")  # Default: MODEL_PATH with .tflite / .onnx
+    # CPU thread budget per worker (0 = runtime default); intra-op also sizes the TFLite / ONNX thread pool
+    INFERENCE_INTRA_OP_THREADS = int(os.environ.get("INFERENCE_INTRA_OP_THREADS", 0))
+    INFERENCE_INTER_OP_THREADS = int(os.environ.get("INFERENCE_INTER_OP_THREADS", 0))
     
     # Optional: Add model-related settings
     PREDICT_THRESHOLD = 0.65
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'tiff'}
     UPLOAD_FOLDER = 'uploads'
+    
+    # Radius search strategy for GET /api/requests: 'bbox', 'grid' or 'memory'
+    REQUESTS_SPATIAL_INDEX = os.environ.get("REQUESTS_SPATIAL_INDEX", "bbox")
+    REQUESTS_MAX_RADIUS_KM = 100  # Larger ?radius_km values are clamped to this
+    SPATIAL_INDEX_REFRESH_SECONDS = 300  # Full rebuild interval of the in-memory index
+    
+    # FingerprintLog audit writer (background batched inserts)
+    AUDIT_LOG_ASYNC = True  # False: insert on the request thread
+    AUDIT_LOG_QUEUE_SIZE = 10000  # Rows buffered in memory before spilling to disk
+    AUDIT_LOG_BATCH_SIZE = 200
+    AUDIT_LOG_FLUSH_SECONDS = 1.0  # Max delay before a partial batch is written
+    AUDIT_LOG_PUT_TIMEOUT_MS = 0  # How long a request may wait for queue room before spilling
+    AUDIT_LOG_SPILL_DIR = os.environ.get("AUDIT_LOG_SPILL_DIR", "audit_spill")
+    AUDIT_LOG_REPLAY_SECONDS = 30
+    
+    # In-process cache of GET /api/requests responses (ETag / 304 support)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_SIZE = 1024
+    RESPONSE_CACHE_TTL_SECONDS = 30
+    RESPONSE_CACHE_SHARED = True  # Invalidate through the cache_versions row, so writes reach every worker
+    RESPONSE_CACHE_GEO_DECIMALS = 2  # lat/lng rounding for list queries (~1 km)
+    
+    # Background expiry sweeper (one leader per deployment via scheduler_locks)
+    EXPIRY_SWEEPER_ENABLED = os.environ.get("EXPIRY_SWEEPER_ENABLED", "0") == "1"
+    EXPIRY_SWEEP_INTERVAL_SECONDS = 60
+    EXPIRY_SWEEP_CHUNK_SIZE = 500  # Rows closed per UPDATE/commit
+    
+    # Bulk import / streaming export (/api/requests/bulk, /api/requests/export)
+    BULK_IMPORT_CHUNK_SIZE = 1000  # Rows per executemany + commit
+    BULK_IMPORT_MAX_ERRORS = 100  # Row errors reported back per import
+    BULK_EXPORT_CHUNK_SIZE = 1000  # Rows fetched per server-side cursor batch
+    
+    # GET /metrics and opt-in request profiling (cProfile .prof files in PROFILE_DIR)
+    METRICS_ENABLED = True
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # Fraction of requests profiled
+    PROFILE_SLOW_MS = 1000  # Sampled profiles are only kept for requests slower than this
+    PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")  # Enables ?profile=1 with a matching X-Profile-Token
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+    
+    # Server-sent events feed (/api/requests/stream)
+    # Relay events between workers via the DB; gunicorn.conf.py turns it on when GUNICORN_WORKERS > 1
+    CHANGE_BUS_SHARED = os.environ.get("CHANGE_BUS_SHARED", "0") == "1"
+    # Open streams per worker, each holds a greenlet (gevent) or a thread (gthread, dev server); 0 = unlimited.
+    # gunicorn.conf.py sets it from the worker class. Over the cap the stream answers 503
+    # and index.js falls back to its 5 minute poll.
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 2))
+    CHANGE_BUS_POLL_SECONDS = 1.0
+    CHANGE_BUS_HISTORY = 1000  # Events kept for Last-Event-ID resume
+    CHANGE_BUS_RETENTION_MINUTES = 60  # change_events rows older than this are purged (shared mode)
+    SSE_HEARTBEAT_SECONDS = 15
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
 class DevelopmentConfig(Config):
     DEBUG = True
     # Override model path for development if needed
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'dev_model.h5')
+    MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(os.path.dirname(__file__), 'models', 'dev_model.h5'))
 
 class ProductionConfig(Config):
     DEBUG = False
     # Production-specific model path
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'prod_model.h5')
+    MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(os.path.dirname(__file__), 'models', 'prod_model.h5'))
 
 class TestingConfig(Config):
     TESTING = True
-    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'tests', 'test_model.h5')
\ No newline at end of file
+    MODEL_PATH = os.path.join(os.path.dirname(__file__), 'tests', 'test_model.h5')
+    MODEL_LOAD_ON_STARTUP = False
+    AUDIT_LOG_ASYNC = False  # Rows are visible as soon as the request returns
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+def get_config(name=None):
+    """Pick the config class for FLASK_ENV (defaults to the base Config)"""
+    return config_by_name.get(name or os.environ.get("FLASK_ENV", ""), Config)
\ No newline at end of file
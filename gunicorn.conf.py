@@ -0,0 +1,65 @@
+import os
+
+# Gunicorn settings (used by the Dockerfile: gunicorn -c gunicorn.conf.py run:app)
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# gevent by default: an open /api/requests/stream connection costs a greenlet,
+# not a thread, so every tab can hold a stream. Model inference and image
+# decoding run on native threads (app/services/cooperative.py), so they don't
+# stall the worker's other connections. Database calls through pyodbc still
+# block the hub while they run; they are short indexed queries, and more
+# workers (GUNICORN_WORKERS) add parallelism. GUNICORN_WORKER_CLASS=gthread
+# goes back to threads, with streams capped at a quarter of them.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Read by config.py when the app is imported (after this file). Past the cap a
+# stream answers 503 and the page falls back to its 5 minute poll.
+if worker_class in ("gevent", "eventlet"):
+    os.environ.setdefault("SSE_MAX_SUBSCRIBERS", str(worker_connections // 2))
+else:
+    os.environ.setdefault("SSE_MAX_SUBSCRIBERS", str(max(1, threads // 4)))
+    # Predictions hold a thread each here; leave half of them for everything else
+    os.environ.setdefault("ADMISSION_MAX_CONCURRENT", str(max(1, threads // 2)))
+# Several workers: each only sees its own writes, so relay change events through the database
+if workers > 1:
+    os.environ.setdefault("CHANGE_BUS_SHARED", "1")
+
+# Preloading imports Flask/SQLAlchemy once in the master and shares those pages
+# with every worker. TensorFlow is never imported in the master, so it is safe
+# to fork: each worker builds its own model in post_worker_init below. Not with
+# gevent: the worker monkey-patches threading after the app was imported.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1" and worker_class not in ("gevent", "eventlet")
+
+def pre_fork(server, worker):
+    # Drop connections the master opened (e.g. db.create_all in run.py) so no
+    # socket is shared between worker processes
+    app = getattr(server.app, "callable", None)
+    if app is None:
+        return
+    from app.models import db
+    with app.app_context():
+        db.engine.dispose()
+
+def post_worker_init(worker):
+    app = worker.wsgi
+    # Every worker runs the sweeper thread; the scheduler_locks lease picks one to sweep
+    from app.services.expiry_sweeper import expiry_sweeper
+    expiry_sweeper.start(app)
+    
+    # Load + warm the model before this worker accepts requests
+    if "model_registry" not in getattr(app, "extensions", {}):
+        return
+    from app.services.model_service import model_registry
+    model_registry.load_on_startup(app)
+
+def worker_exit(server, worker):
+    # Write out queued audit rows before the worker goes away
+    app = worker.wsgi
+    if "audit_log" not in getattr(app, "extensions", {}):
+        return
+    from app.services.audit_log import audit_log
+    audit_log.flush()
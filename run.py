@@ -1,7 +1,8 @@
 from app import create_app
 from app.models import db, BloodRequest, DonorOptIn, FingerprintLog
+from config import get_config
 
-app = create_app()
+app = create_app(get_config())
 
 # Create tables automatically on startup
 with app.app_context():
@@ -9,4 +10,8 @@ with app.app_context():
     print("✅ Database tables created successfully!")
 
 if __name__ == "__main__":
+    from app.services.model_service import model_registry
+    from app.services.expiry_sweeper import expiry_sweeper
+    model_registry.load_on_startup(app)
+    expiry_sweeper.start(app)
     app.run(debug=True, host="0.0.0.0", port=5000)